@@ -0,0 +1,149 @@
+import json
+import os
+import random
+from typing import Callable, Dict
+
+################################################################################
+# Synthetic inputs
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog and cat while encyclopedia readers "
+    "wonder about python workout files generators comprehensions"
+).split()
+PUNCTUATION = ["", "", "", ",", ".", "!", "?", "...", "'s", ";"]
+SUBJECTS = ["math", "literature", "science", "history", "art"]
+SHELLS = ["/bin/bash", "/bin/zsh", "/usr/sbin/nologin", "/bin/false"]
+PATHS = ["/", "/index.php", "/about", "/static/app.js", "/api/items", "/login"]
+STATUSES = [200, 200, 200, 200, 304, 404, 500]
+
+
+def write_lines(
+    path: str, size: int, make_line: Callable[[random.Random, int], str], seed: int = 0
+) -> None:
+    """Writes lines from make_line(rng, line_number) until the file holds at least size bytes"""
+    rng = random.Random(seed)
+    written = 0
+    i = 0
+    with open(path, "w", buffering=1 << 20) as f:
+        while written < size:
+            line = make_line(rng, i)
+            f.write(line)
+            written += len(line)
+            i += 1
+
+
+def tsv_line(rng: random.Random, i: int) -> str:
+    """Two integer columns, like data/nums.tsv, with an occasional header or short line"""
+    if i % 1000 == 999:
+        return "comment\n"
+    return f"{rng.randrange(1000)}\t{rng.randrange(1000)}\n"
+
+
+def text_line(rng: random.Random, i: int) -> str:
+    """Prose with punctuation and the odd URL, for word counting and normalizing"""
+    words = [
+        rng.choice(WORDS) + rng.choice(PUNCTUATION) for _ in range(rng.randint(5, 15))
+    ]
+    if i % 50 == 0:
+        words.append(f"https://www.example.org/page{i}")
+    return " ".join(words) + "\n"
+
+
+def passwd_line(rng: random.Random, i: int) -> str:
+    if i % 100 == 0:
+        return "# comment\n"
+    return (
+        f"user{i}:*:{1000 + i}:{1000 + i % 50}:User {i}:/home/user{i}:"
+        f"{rng.choice(SHELLS)}\n"
+    )
+
+
+def log_line(rng: random.Random, i: int) -> str:
+    """Apache combined log format, quoted like data/log.txt"""
+    second = i // 10
+    clock = f"{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+    return (
+        f'"192.168.{rng.randrange(4)}.{rng.randrange(256)} - - '
+        f"[22/Dec/2016:{clock} +0300] "
+        f'"GET {rng.choice(PATHS)} HTTP/1.1" {rng.choice(STATUSES)} '
+        f'{rng.randrange(100, 10000)} "-" "Mozilla/5.0""\n'
+    )
+
+
+def write_tsv_file(path: str, size: int) -> None:
+    write_lines(path, size, tsv_line)
+
+
+def write_text_file(path: str, size: int) -> None:
+    write_lines(path, size, text_line)
+
+
+def write_passwd_file(path: str, size: int) -> None:
+    write_lines(path, size, passwd_line)
+
+
+def write_access_log(path: str, size: int) -> None:
+    write_lines(path, size, log_line)
+
+
+def write_text_directory(path: str, size: int, files: int = 200) -> None:
+    os.makedirs(path, exist_ok=True)
+    for i in range(files):
+        write_lines(os.path.join(path, f"{i}.txt"), size // files, text_line, seed=i)
+
+
+def write_score_directory(path: str, size: int, files: int = 50) -> None:
+    """One JSON file of test scores (a list of {subject: score} dicts) per class"""
+    os.makedirs(path, exist_ok=True)
+    # A {subject: score} dict with all five subjects is about 90 bytes of JSON
+    records = max(1, size // files // 90)
+    for i in range(files):
+        rng = random.Random(i)
+        scores = [
+            {subject: rng.randint(40, 100) for subject in SUBJECTS}
+            for _ in range(records)
+        ]
+        with open(os.path.join(path, f"class{i}.json"), "w") as f:
+            json.dump(scores, f)
+
+
+INPUTS = {
+    "tsv": write_tsv_file,
+    "text": write_text_file,
+    "passwd": write_passwd_file,
+    "log": write_access_log,
+    "text_dir": write_text_directory,
+    "score_dir": write_score_directory,
+}
+
+
+def generate_inputs(directory: str, size: int) -> Dict[str, str]:
+    """Writes every kind of input, each about size bytes, to a directory that is reused when
+    it already holds inputs of the same size. Returns a dict of input kind to path.
+
+    Args:
+        directory: Directory to write the inputs to
+        size: Approximate size in bytes of each input
+    """
+    os.makedirs(directory, exist_ok=True)
+    marker = os.path.join(directory, "size")
+    paths = {kind: os.path.join(directory, kind) for kind in INPUTS}
+    try:
+        with open(marker, "r") as f:
+            if int(f.read()) == size:
+                return paths
+    except (FileNotFoundError, ValueError):
+        pass
+    for kind, write in INPUTS.items():
+        write(paths[kind], size)
+    with open(marker, "w") as f:
+        f.write(str(size))
+    return paths
+
+
+def input_size(path: str) -> int:
+    """Size in bytes of a file, or of all the files in a directory"""
+    if os.path.isdir(path):
+        with os.scandir(path) as entries:
+            return sum(entry.stat().st_size for entry in entries if entry.is_file())
+    return os.path.getsize(path)
@@ -0,0 +1,451 @@
+"""Times the file-processing functions in src/files, and BiDict against flip_dict, on synthetic
+inputs.
+
+Run from the repo root:
+
+    python -m benchmarks.run --size-mb 16 --output benchmarks/results/new.json
+    python -m benchmarks.run --compare benchmarks/results/old.json
+
+Every benchmark runs in its own process, so its peak RSS isn't inflated by the ones before it.
+Results are written as JSON, and --compare exits with status 1 when a benchmark got slower
+than the baseline by more than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from benchmarks.inputs import generate_inputs, input_size
+from src.comprehensions import comprehensions
+from src.files import access_log, files
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+################################################################################
+# Benchmarks
+
+
+class Benchmark(NamedTuple):
+    name: str
+    input: str  # Key of benchmarks.inputs.INPUTS
+    setup: Callable[[str, str], Callable[[], Any]]
+    covers: Tuple[str, ...]  # Public names of files.py the benchmark exercises
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(input: str, *covers: str) -> Callable:
+    """Registers a setup function under its own name. The setup function is called with the
+    input path and a scratch directory, and returns the zero-argument callable that is timed.
+    covers defaults to the benchmark's name."""
+
+    def register(setup: Callable[[str, str], Callable[[], Any]]) -> Callable:
+        BENCHMARKS[setup.__name__] = Benchmark(
+            setup.__name__, input, setup, covers or (setup.__name__,)
+        )
+        return setup
+
+    return register
+
+
+def consume(iterator) -> None:
+    for _ in iterator:
+        pass
+
+
+@benchmark("text")
+def final_line(path, scratch):
+    return lambda: files.final_line(path)
+
+
+@benchmark("text")
+def last_lines(path, scratch):
+    return lambda: files.last_lines(path, 1000)
+
+
+@benchmark("text", "follow", "follow_open_file")
+def follow(path, scratch):
+    return lambda: consume(
+        files.follow(path, from_start=True, poll_interval=0, idle_timeout=0)
+    )
+
+
+@benchmark("tsv")
+def is_empty_file(path, scratch):
+    return lambda: files.is_empty_file(path)
+
+
+@benchmark("tsv")
+def sum_multi_columns(path, scratch):
+    return lambda: files.sum_multi_columns(path)
+
+
+@benchmark("tsv")
+def reduce_columns(path, scratch):
+    return lambda: files.reduce_columns(path, reduction="column_sum")
+
+
+@benchmark("passwd", "PasswdDatabase")
+def passwd_database(path, scratch):
+    return lambda: files.PasswdDatabase.from_file(path)
+
+
+@benchmark("passwd")
+def load_passwd(path, scratch):
+    def run():
+        files.PASSWD_CACHE.clear()
+        return files.load_passwd(path)
+
+    return run
+
+
+@benchmark("passwd")
+def passwd_to_dict(path, scratch):
+    def run():
+        files.PASSWD_CACHE.clear()
+        return files.passwd_to_dict(path)
+
+    return run
+
+
+@benchmark("passwd")
+def read_passwd(path, scratch):
+    def run():
+        files.PASSWD_CACHE.clear()
+        return files.read_passwd(path)
+
+    return run
+
+
+@benchmark("passwd", "write_passwd", "write_tsv", "format_tsv_batch", "iter_batches")
+def write_passwd(path, scratch):
+    rows = files.read_passwd(path)
+    return lambda: files.write_passwd(rows, os.path.join(scratch, "passwd.tsv"))
+
+
+@benchmark("passwd")
+def passwd_to_tsv(path, scratch):
+    def run():
+        files.PASSWD_CACHE.clear()
+        files.passwd_to_tsv(path, os.path.join(scratch, "passwd.tsv"))
+
+    return run
+
+
+@benchmark("text", "normalize", "Normalizer")
+def normalize(path, scratch):
+    with open(path, "r") as f:
+        lines = f.readlines()
+    return lambda: files.NORMALIZER.normalize_many(lines)
+
+
+@benchmark("text")
+def count_chars(path, scratch):
+    with open(path, "r") as f:
+        words = f.read().split()
+    return lambda: files.count_chars(words)
+
+
+@benchmark("text", "word_count", "count_lines")
+def word_count(path, scratch):
+    return lambda: files.word_count(path)
+
+
+@benchmark(
+    "text",
+    "word_count_parallel",
+    "split_byte_ranges",
+    "read_byte_range",
+    "count_byte_range",
+    "map_byte_ranges",
+    "imap_bounded",
+)
+def word_count_parallel(path, scratch):
+    return lambda: files.word_count_parallel(path, workers=2)
+
+
+@benchmark("text")
+def find_longest_word(path, scratch):
+    return lambda: files.find_longest_word(path)
+
+
+@benchmark("text")
+def find_longest_words(path, scratch):
+    return lambda: files.find_longest_words(path, 100)
+
+
+@benchmark(
+    "text_dir",
+    "find_all_longest_words",
+    "iter_regular_files",
+    "analyze_directory",
+    "analyze_entries",
+)
+def find_all_longest_words(path, scratch):
+    return lambda: files.find_all_longest_words(path)
+
+
+@benchmark("text_dir", "analyze_in_pool", "analyze_file")
+def find_all_longest_words_processes(path, scratch):
+    return lambda: files.find_all_longest_words(path, workers=2, executor="process")
+
+
+@benchmark("text_dir", "DirectoryIndex", "file_digest")
+def directory_index(path, scratch):
+    manifest_path = os.path.join(scratch, "manifest.json")
+
+    def run():
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return files.DirectoryIndex(
+            manifest_path, files.find_longest_word, hash_files=True
+        ).update(path)
+
+    return run
+
+
+@benchmark("text_dir")
+def directory_index_unchanged(path, scratch):
+    manifest_path = os.path.join(scratch, "manifest.json")
+    files.DirectoryIndex(manifest_path, files.find_longest_word).update(path)
+    return lambda: files.DirectoryIndex(manifest_path, files.find_longest_word).update(
+        path
+    )
+
+
+@benchmark("score_dir", "analyze_scores", "score_stats", "merge_score_stats")
+def analyze_scores(path, scratch):
+    return lambda: files.analyze_scores(path, os.path.join(scratch, "scores.tsv"))
+
+
+@benchmark("text")
+def reverse_lines(path, scratch):
+    return lambda: files.reverse_lines(path, os.path.join(scratch, "reversed.txt"))
+
+
+@benchmark("text")
+def reverse_lines_binary(path, scratch):
+    return lambda: files.reverse_lines(
+        path, os.path.join(scratch, "reversed.txt"), binary=True
+    )
+
+
+# Reverse lookups of uid -> username, by rebuilding the inverse with flip_dict for every lookup
+# (as callers used to) and through a BiDict's inverse
+REVERSE_LOOKUPS = 100
+
+
+def uids_by_name(path: str) -> Dict[str, str]:
+    return {name: record[2] for name, record in files.load_passwd(path).by_name.items()}
+
+
+@benchmark("passwd")
+def flip_dict_lookups(path, scratch):
+    uids = uids_by_name(path)
+    lookups = list(uids.values())[:REVERSE_LOOKUPS]
+    return lambda: [comprehensions.flip_dict(uids)[uid] for uid in lookups]
+
+
+@benchmark("passwd")
+def bidict_lookups(path, scratch):
+    uids = uids_by_name(path)
+    lookups = list(uids.values())[:REVERSE_LOOKUPS]
+
+    def run():
+        bidict = comprehensions.BiDict(uids)
+        return [bidict.key_of(uid) for uid in lookups]
+
+    return run
+
+
+@benchmark("log")
+def iter_log(path, scratch):
+    return lambda: consume(access_log.iter_log(path))
+
+
+@benchmark("log")
+def analyze_log(path, scratch):
+    return lambda: access_log.analyze_log(path)
+
+
+################################################################################
+# Running
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """Peak resident set size in bytes of this process, or with children of its largest
+    finished child process (e.g. a pool worker). None where it isn't available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_benchmark(name: str, path: str, repeat: int) -> Dict[str, Any]:
+    """Runs one benchmark in this process. The throughput is the input's size over the best
+    time."""
+    bench = BENCHMARKS[name]
+    with tempfile.TemporaryDirectory() as scratch:
+        func = bench.setup(path, scratch)
+        setup_rss = peak_rss()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    size = input_size(path)
+    return {
+        "name": name,
+        "input": bench.input,
+        "input_bytes": size,
+        "best_s": min(times),
+        "median_s": statistics.median(times),
+        "mb_per_s": size / min(times) / 1e6 if min(times) else None,
+        "setup_peak_rss_bytes": setup_rss,
+        "peak_rss_bytes": peak_rss(),
+        "children_peak_rss_bytes": peak_rss(children=True),
+    }
+
+
+def run_in_subprocess(name: str, path: str, repeat: int) -> Dict[str, Any]:
+    """Runs one benchmark in a fresh interpreter, with the on-disk result cache disabled"""
+    env = {key: value for key, value in os.environ.items() if key != "FILES_CACHE_PATH"}
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--child", name, path, str(repeat)],
+        cwd=REPO_ROOT,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    return json.loads(completed.stdout)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def run_all(
+    size: int, inputs_dir: str, repeat: int, names: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Generates the inputs (or reuses them) and runs the selected benchmarks, each in its own
+    process.
+
+    Args:
+        size: Approximate size in bytes of each input
+        inputs_dir: Directory the inputs are generated in
+        repeat: Number of timed calls per benchmark
+        names: Benchmarks to run. None runs all of them
+    """
+    paths = generate_inputs(inputs_dir, size)
+    results = []
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"unknown benchmark {name!r}")
+        result = run_in_subprocess(name, paths[BENCHMARKS[name].input], repeat)
+        print(format_result(result), file=sys.stderr)
+        results.append(result)
+    return {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "input_size": size,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    rate = "" if result["mb_per_s"] is None else f"{result['mb_per_s']:10.1f} MB/s"
+    rss = result["peak_rss_bytes"]
+    rss = "" if rss is None else f"{rss / (1 << 20):8.1f} MiB"
+    return f"{result['name']:34} {result['best_s']:9.4f} s {rate} {rss}"
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Prints the best-time ratio of every benchmark in both runs, and returns the names of
+    those that got slower by more than threshold (0.1 = 10%)."""
+    old = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        if result["name"] not in old:
+            continue
+        ratio = result["best_s"] / old[result["name"]]["best_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:34} {ratio:6.2f}x{flag}", file=sys.stderr)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=16, help="size of each input")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="timed calls per benchmark"
+    )
+    parser.add_argument(
+        "--inputs-dir",
+        default=os.path.join(tempfile.gettempdir(), "files-benchmark-inputs"),
+        help="where inputs are generated, and reused from when their size matches",
+    )
+    parser.add_argument(
+        "--output", help="results JSON (default: results/<commit>.json)"
+    )
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        name, path, repeat = args.child
+        print(json.dumps(run_benchmark(name, path, int(repeat))))
+        return 0
+
+    report = run_all(
+        int(args.size_mb * (1 << 20)), args.inputs_dir, args.repeat, args.names
+    )
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"{(report['commit'] or 'local')[:12]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            if compare(json.load(f), report, args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
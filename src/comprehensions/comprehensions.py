@@ -1,9 +1,40 @@
+import bisect
+import csv
+import heapq
+import inspect
 import json
-import pathlib
+import mmap
+import os
 import re
 import string
-from collections import Counter, defaultdict
-from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
+import types
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from itertools import chain, islice, repeat
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from src.files.files import (
+    iter_batches,
+    load_passwd,
+    map_byte_ranges,
+    read_byte_range,
+)
 
 
 ################################################################################
@@ -40,24 +71,263 @@ def reverse_lines_in_file(file_path: str) -> List[str]:
         return [line.strip()[::-1] for line in fp]
 
 
+def iter_reversed_lines(file_path: str) -> Iterator[str]:
+    """Given a file path, yields each line of the file reversed, one line at a time, so memory
+    doesn't grow with the size of the file.
+
+    Args:
+        file_path: Path to the input file.
+    """
+    with open(file_path, "r") as fp:
+        for line in fp:
+            yield line.strip()[::-1]
+
+
+def iter_reversed_chunks(
+    file_path: str, chunk_size: int = 1 << 20
+) -> Iterator[List[str]]:
+    """Given a file path, yields lists of reversed lines. The file is read chunk_size characters
+    at a time, and each chunk is split into lines once and reversed in one comprehension. Only
+    one chunk of lines is held in memory at a time.
+
+    Args:
+        file_path: Path to the input file.
+        chunk_size: Number of characters read per chunk
+    """
+    with open(file_path, "r") as fp:
+        pending = ""
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            lines = (pending + chunk).split("\n")
+            pending = lines.pop()
+            if lines:
+                yield [line.strip()[::-1] for line in lines]
+        if pending:
+            yield [pending.strip()[::-1]]
+
+
+def write_reversed_lines(
+    file_path: str, write_path: str, chunk_size: int = 1 << 20
+) -> None:
+    """Given a file path, writes each line of the file reversed to write_path, one write() per
+    chunk of lines, without building the list of all lines.
+
+    Args:
+        file_path: Path to the input file.
+        write_path: Path to the output file.
+        chunk_size: Number of characters read per chunk
+    """
+    with open(write_path, "w") as fp:
+        for lines in iter_reversed_chunks(file_path, chunk_size):
+            fp.write("\n".join(lines) + "\n")
+
+
 def sum_numbers(text_sequence: str) -> int:
     """Given a string of space delimited tokens, sums only the valid integers.
 
     Args:
         text_sequence: Space delimited sequence of tokens
     """
-    return sum(int(token) for token in text_sequence.split() if token.isdigit())
+    # Attempt 1:
+    # return sum(int(token) for token in text_sequence.split() if token.isdigit())
+
+    # Attempt 2: Filters and converts in C, without a generator frame per token
+    return sum(map(int, filter(str.isdigit, text_sequence.split())))
+
+
+WHITESPACE = re.compile(rb"\s")
 
 
-def filter_to_lexically_diverse(file_path: str) -> List[str]:
+def token_aligned_ranges(
+    buffer: bytes, chunk_size: int, start: int = 0, end: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """Splits buffer[start:end] into (start, end) ranges of about chunk_size bytes. Every range
+    but the last ends just after a whitespace byte, so no token is cut in two.
+
+    Args:
+        buffer: bytes or mmap
+        chunk_size: Approximate number of bytes per range
+        start: Offset to start at, which should be 0 or just after a whitespace byte
+        end: Offset to stop at. Defaults to the end of the buffer
+    """
+    end = len(buffer) if end is None else end
+    ranges = []
+    while start < end:
+        match = WHITESPACE.search(buffer, min(start + chunk_size, end), end)
+        stop = match.end() if match else end
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def sum_numbers_in_buffer(
+    buffer: bytes,
+    start: int = 0,
+    end: Optional[int] = None,
+    chunk_size: int = 1 << 20,
+) -> int:
+    """Same result as sum_numbers, for buffer[start:end] of ASCII-compatible text (e.g. an
+    mmap'd file). Tokens are split on ASCII whitespace and only runs of ASCII digits count. The
+    buffer is split chunk_size bytes at a time, so only one chunk's tokens exist at once.
+
+    Args:
+        buffer: bytes or mmap
+        start: Offset to start at, which should be 0 or just after a whitespace byte
+        end: Offset to stop at. Defaults to the end of the buffer
+        chunk_size: Approximate number of bytes split per step
+    """
+    return sum(
+        sum(map(int, filter(bytes.isdigit, buffer[chunk_start:chunk_end].split())))
+        for chunk_start, chunk_end in token_aligned_ranges(
+            buffer, chunk_size, start, end
+        )
+    )
+
+
+def sum_numbers_in_range(file_path: str, start: int, end: int) -> int:
+    """Sums the integer tokens in one token-aligned byte range of a file. Used as the worker of
+    sum_numbers_in_file."""
+    with open(file_path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        return sum_numbers_in_buffer(buffer, start, end)
+
+
+def sum_numbers_in_file(
+    file_path: str, workers: int = 1, chunk_size: int = 1 << 26
+) -> int:
+    """Given a file path, sums the integer tokens of the whole file like sum_numbers, without
+    decoding it or reading it into memory: the file is mmap'd and scanned as bytes.
+
+    With more than one worker, the file is split into token-aligned byte ranges of about
+    chunk_size bytes that are summed in a pool of processes.
+
+    Args:
+        file_path: Path to the input file.
+        workers: Number of worker processes. 1 runs in the calling process
+        chunk_size: Approximate number of bytes per worker task
+    """
+    if os.path.getsize(file_path) == 0:
+        return 0
+    with open(file_path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        if workers == 1:
+            return sum_numbers_in_buffer(buffer)
+        ranges = token_aligned_ranges(buffer, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(
+            pool.map(
+                sum_numbers_in_range,
+                repeat(file_path),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
+            )
+        )
+
+
+def filter_to_lexically_diverse(file_path: str, threshold: int = 20) -> List[str]:
     """Given a file path, read contents of a file and return a list with lines that contain
-     more than 20 unique words.
+     more than threshold (by default 20) unique words.
 
     Args:
         file_path: Path to the input file.
+        threshold: Number of unique words a line must exceed
     """
+    # Attempt 1: Builds the set of every line's words
+    # with open(file_path, "r") as fp:
+    #     return [line.strip() for line in fp if len(set(line.strip().split())) > 20]
+
+    # Attempt 2:
     with open(file_path, "r") as fp:
-        return [line.strip() for line in fp if len(set(line.strip().split())) > 20]
+        return [line.strip() for line in fp if is_lexically_diverse(line, threshold)]
+
+
+def is_lexically_diverse(line: str, threshold: int = 20) -> bool:
+    """Checks whether a line has more than threshold unique words. Lines with too few words are
+    rejected without building a set, and words are added to the set only until the threshold
+    is passed: each step adds just as many words as are still missing.
+
+    Args:
+        line: Line of text
+        threshold: Number of unique words the line must exceed
+    """
+    words = line.split()
+    if len(words) <= threshold:
+        return False
+    seen = set(words[: threshold + 1])
+    i = threshold + 1
+    while len(seen) <= threshold:
+        if i >= len(words):
+            return False
+        missing = threshold + 1 - len(seen)
+        seen.update(words[i : i + missing])
+        i += missing
+    return True
+
+
+def lexical_diversity(line: str) -> int:
+    """Returns the number of unique words in a line, for ranking lines by diversity."""
+    return len(set(line.split()))
+
+
+def iter_lexically_diverse(
+    lines: Iterable[str], threshold: int = 20, scores: bool = False
+) -> Iterator[Union[str, Tuple[str, int]]]:
+    """Yields the stripped lines that have more than threshold unique words, or with scores,
+    (line, number of unique words) tuples. Scoring counts every word, so it gives up the early
+    exit of is_lexically_diverse.
+
+    Args:
+        lines: Lines of text, e.g. an open file
+        threshold: Number of unique words a line must exceed
+        scores: Yield (line, score) tuples instead of lines
+    """
+    if not scores:
+        return (line.strip() for line in lines if is_lexically_diverse(line, threshold))
+    scored = ((line.strip(), lexical_diversity(line)) for line in lines)
+    return ((line, score) for line, score in scored if score > threshold)
+
+
+def filter_byte_range(
+    file_path: str, start: int, end: int, threshold: int, scores: bool
+) -> List[Union[str, Tuple[str, int]]]:
+    """Filters one newline-aligned byte range of a file. Used as the worker of
+    filter_to_lexically_diverse_parallel."""
+    lines = read_byte_range(file_path, start, end)
+    return list(iter_lexically_diverse(lines, threshold, scores))
+
+
+def filter_to_lexically_diverse_parallel(
+    file_path: str,
+    threshold: int = 20,
+    scores: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = 1 << 26,
+) -> Iterator[Union[str, Tuple[str, int]]]:
+    """Same lines as iter_lexically_diverse over the file, in file order, but the file is split
+    into newline-aligned byte ranges that are filtered in a pool of processes. Results are
+    yielded one range at a time.
+
+    Args:
+        file_path: Path to the input file.
+        threshold: Number of unique words a line must exceed
+        scores: Yield (line, score) tuples instead of lines
+        workers: Number of worker processes. Defaults to the number of CPUs
+        chunk_size: Upper bound on the bytes a worker holds in memory at once
+    """
+    workers = workers or os.cpu_count() or 1
+    for lines in map_byte_ranges(
+        file_path,
+        filter_byte_range,
+        threshold,
+        scores,
+        workers=workers,
+        chunk_size=chunk_size,
+    ):
+        yield from lines
 
 
 def change_area_code(tel_num: str) -> str:
@@ -84,6 +354,134 @@ def change_area_code(tel_num: str) -> str:
     )
 
 
+# Area codes of XXX-YYY-ZZZZ numbers in free text, for any YYY or only those starting with 0-5.
+# re.ASCII makes \b and the scan about twice as fast as with Unicode matching.
+AREA_CODE = re.compile(r"\b([0-9]{3})(?=-[0-9]{3}-[0-9]{4}\b)", re.ASCII)
+LOW_EXCHANGE_AREA_CODE = re.compile(
+    r"\b([0-9]{3})(?=-[0-5][0-9]{2}-[0-9]{4}\b)", re.ASCII
+)
+# The change_area_code rule, precomputed for every area code
+AREA_CODE_INCREMENTS = {f"{code:03d}": str(code + 1) for code in range(1000)}
+
+
+def area_code_table(table: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Returns a lookup with an entry for every three-digit area code: the given remappings,
+    and every other area code mapped to itself. None returns AREA_CODE_INCREMENTS.
+
+    Args:
+        table: Area code to new area code, e.g. {"212": "646"}
+    """
+    if table is None:
+        return AREA_CODE_INCREMENTS
+    lookup = {f"{code:03d}": f"{code:03d}" for code in range(1000)}
+    lookup.update(table)
+    return lookup
+
+
+def change_area_codes(text: str, table: Optional[Dict[str, str]] = None) -> str:
+    """Rewrites the area code of every XXX-YYY-ZZZZ telephone number in a chunk of text with one
+    compiled regex pass. Without a table, applies the change_area_code rule (XXX+1 when YYY
+    begins with 0-5). With a table, remaps area codes found in it, whatever YYY is.
+
+    Args:
+        text: Text containing telephone numbers delimited by non-word characters
+        table: Area code to new area code
+    """
+    pattern = LOW_EXCHANGE_AREA_CODE if table is None else AREA_CODE
+    # The capturing group makes split return [text, area code, text, area code, ..., text]
+    parts = pattern.split(text)
+    parts[1::2] = map(area_code_table(table).__getitem__, parts[1::2])
+    return "".join(parts)
+
+
+def change_area_codes_many(
+    tel_nums: Iterable[str],
+    table: Optional[Dict[str, str]] = None,
+    batch_size: int = 10000,
+) -> Iterator[str]:
+    """Applies change_area_code (or, with a table, the table's remapping) to every number of an
+    iterable of 10 digit telephone numbers in XXX-YYY-ZZZZ format, one batch at a time.
+
+    Args:
+        tel_nums: 10 digit telephones in XXX-YYY-ZZZZ format
+        table: Area code to new area code
+        batch_size: Number of numbers rewritten per list comprehension
+    """
+    lookup = area_code_table(table)
+    for batch in iter_batches(tel_nums, batch_size):
+        if table is None:
+            yield from [
+                lookup[tel_num[:3]] + tel_num[3:] if tel_num[4] in "012345" else tel_num
+                for tel_num in batch
+            ]
+        else:
+            yield from [lookup[tel_num[:3]] + tel_num[3:] for tel_num in batch]
+
+
+def change_area_codes_in_file(
+    read_path: str,
+    write_path: str,
+    table: Optional[Dict[str, str]] = None,
+    chunk_size: int = 1 << 20,
+) -> None:
+    """Streams a text file (e.g. a CSV export) to write_path with every telephone number's area
+    code rewritten as in change_area_codes. Whole lines are read about chunk_size characters at
+    a time, so numbers are never split, and each chunk is rewritten and written at once.
+
+    Args:
+        read_path: Path to the input file
+        write_path: Path to the output file
+        table: Area code to new area code
+        chunk_size: Approximate number of characters per chunk
+    """
+    with open(read_path, "r", newline="") as rf, open(
+        write_path, "w", newline=""
+    ) as wf:
+        while True:
+            lines = rf.readlines(chunk_size)
+            if not lines:
+                break
+            wf.write(change_area_codes("".join(lines), table))
+
+
+def change_area_codes_in_column(
+    read_path: str,
+    write_path: str,
+    column: int,
+    table: Optional[Dict[str, str]] = None,
+    header: bool = False,
+    delimiter: str = ",",
+    batch_size: int = 10000,
+) -> None:
+    """Streams a CSV file to write_path, rewriting the XXX-YYY-ZZZZ telephone numbers of one
+    column as in change_area_codes_many. Rows too short to have the column are copied as is.
+
+    Args:
+        read_path: Path to the input CSV
+        write_path: Path to the output CSV
+        column: Index of the telephone number column
+        table: Area code to new area code
+        header: Copy the first row unchanged
+        delimiter: CSV field delimiter
+        batch_size: Number of rows rewritten and written at once
+    """
+    with open(read_path, "r", newline="") as rf, open(
+        write_path, "w", newline=""
+    ) as wf:
+        reader = csv.reader(rf, delimiter=delimiter)
+        writer = csv.writer(wf, delimiter=delimiter)
+        if header:
+            writer.writerows(islice(reader, 1))
+        for rows in iter_batches(reader, batch_size):
+            rewritable = [row for row in rows if len(row) > column]
+            tel_nums = change_area_codes_many(
+                [row[column] for row in rewritable], table, batch_size
+            )
+            for row, tel_num in zip(rewritable, tel_nums):
+                row[column] = tel_num
+            writer.writerows(rows)
+
+
 ################################################################################
 # Flatten
 
@@ -114,11 +512,112 @@ def flatten_odd_ints(iters: List[List[Union[int, str]]]) -> List[int]:
     #         if str(i).isdigit() and int(i) % 2 == 1:
     #             f.append(i)
     # return f
+
+    # Attempt 2: Calls str() and int() twice per element, even for ints
+    # return [
+    #     int(i) for iter in iters for i in iter if str(i).isdigit() and int(i) % 2 == 1
+    # ]
+
+    # Attempt 3: ints are checked directly, everything else is converted once
     return [
-        int(i) for iter in iters for i in iter if str(i).isdigit() and int(i) % 2 == 1
+        n
+        for iter in iters
+        for i in iter
+        if (n := i if type(i) is int else to_non_negative_int(i)) is not None
+        and n >= 0
+        and n & 1
     ]
 
 
+def to_non_negative_int(value: Any) -> Optional[int]:
+    """Converts a value to an int if it's a non-negative int or its str() is all digits, as in
+    flatten_odd_ints. Returns None otherwise.
+
+    Args:
+        value: Any value
+    """
+    if type(value) is int:
+        return value if value >= 0 else None
+    text = value if isinstance(value, str) else str(value)
+    return int(text) if text.isdigit() else None
+
+
+# Iterables that are yielded whole by iter_flatten instead of being flattened
+ATOMS = (str, bytes, bytearray)
+# Types that are known not to be iterable, checked before falling back to iter()
+SCALARS = {int, float, complex, bool, type(None)}
+SKIP = object()
+
+
+def iter_flatten(
+    nested: Iterable, steps: Sequence[Callable[[Any], Any]] = ()
+) -> Iterator[Any]:
+    """Lazily yields the atoms of arbitrarily nested iterables, depth first. Strings, bytes and
+    non-iterable values are atoms. The nesting is walked with a stack of iterators rather than
+    recursion, so memory only grows with the depth of the nesting, and any depth works.
+
+    Each atom is passed through steps in order, in the same pass: a step returns the (possibly
+    converted) value, or SKIP to drop the atom. E.g.
+    steps=(to_non_negative_int, keep_if(lambda n: n & 1)) keeps odd ints, like flatten_odd_ints.
+
+    Args:
+        nested: Arbitrarily nested iterables
+        steps: Functions applied to each atom in order
+    """
+    stack = [iter(nested)]
+    while stack:
+        for item in stack[-1]:
+            if type(item) not in SCALARS and not isinstance(item, ATOMS):
+                try:
+                    stack.append(iter(item))
+                    break
+                except TypeError:
+                    pass
+            for step in steps:
+                item = step(item)
+                if item is SKIP:
+                    break
+            else:
+                yield item
+        else:
+            stack.pop()
+
+
+def keep_if(predicate: Callable[[Any], bool]) -> Callable[[Any], Any]:
+    """Turns a predicate into an iter_flatten step that drops values failing it (and None, so
+    it can follow a conversion step like to_non_negative_int)."""
+
+    def step(value):
+        return value if value is not None and predicate(value) else SKIP
+
+    return step
+
+
+def flatten_deep(nested: Iterable, steps: Sequence[Callable[[Any], Any]] = ()) -> List:
+    """Same as iter_flatten, collected into a list"""
+    return list(iter_flatten(nested, steps))
+
+
+def flatten_to_array(iters: Iterable[Iterable[int]], typecode: str = "q") -> array:
+    """Flattens a list of lists of ints straight into an array.array (64-bit signed ints by
+    default), which uses 8 bytes per int instead of a list's pointer plus int object. The array
+    supports the buffer protocol, so numpy.frombuffer(result, dtype=numpy.int64) views it
+    without a copy.
+
+    Args:
+        iters: List of lists of ints
+        typecode: array.array typecode
+    """
+    result = array(typecode)
+    for one_list in iters:
+        # fromlist converts a list about twice as fast as extend
+        if type(one_list) is list:
+            result.fromlist(one_list)
+        else:
+            result.extend(one_list)
+    return result
+
+
 def get_children(tree: Dict[str, List[str]]) -> List[str]:
     """Reads a dict that represents the children and grandchildren in a family. Each key will be a
     child’s name, and each value will be a list of strings representing their children (i.e.,
@@ -150,6 +649,79 @@ def sort_children_by_oldest(
     return [d["name"] for d in result]
 
 
+class FamilyTree:
+    """A family tree of children and their grandchildren, in the format sort_children_by_oldest
+    takes, that keeps its grandchildren in an age-ordered index. The index is a list of
+    (-age, insertion number, name) tuples kept sorted with bisect as grandchildren are added and
+    removed, so eldest queries never re-sort. Grandchildren of the same age are ordered by when
+    they were inserted. For a tree that's only been built from a dict, that's the order
+    sort_children_by_oldest gives, but a grandchild added later comes after every grandchild
+    of its age, whichever child it belongs to.
+    """
+
+    def __init__(
+        self, tree: Optional[Dict[str, List[Dict[str, Union[int, str]]]]] = None
+    ):
+        self.children = {}  # child -> [(name, age, insertion number), ...]
+        self.index = []
+        self.inserted = 0
+        for child, grandchildren in (tree or {}).items():
+            records = self.children.setdefault(child, [])
+            for grandchild in grandchildren:
+                name, age = grandchild["name"], grandchild["age"]
+                records.append((name, age, self.inserted))
+                self.index.append((-age, self.inserted, name))
+                self.inserted += 1
+        # One sort for the initial tree instead of an insort per grandchild
+        self.index.sort()
+
+    def add(self, child: str, name: str, age: int) -> None:
+        """Adds a grandchild under child, adding the child if it's new"""
+        self.children.setdefault(child, []).append((name, age, self.inserted))
+        bisect.insort(self.index, (-age, self.inserted, name))
+        self.inserted += 1
+
+    def remove(self, child: str, name: str) -> None:
+        """Removes the first grandchild called name under child. Raises KeyError if there's no
+        such grandchild."""
+        records = self.children.get(child, [])
+        for position, (record_name, age, inserted) in enumerate(records):
+            if record_name == name:
+                del records[position]
+                del self.index[bisect.bisect_left(self.index, (-age, inserted))]
+                return
+        raise KeyError(f"{child!r} has no child {name!r}")
+
+    def remove_child(self, child: str) -> None:
+        """Removes a child with all of its grandchildren"""
+        records = self.children.pop(child)
+        if len(records) > len(self.index) // 16:
+            # Rebuilding is cheaper than many single deletes from a long list
+            removed = {inserted for _, _, inserted in records}
+            self.index = [entry for entry in self.index if entry[1] not in removed]
+            return
+        for _, age, inserted in records:
+            del self.index[bisect.bisect_left(self.index, (-age, inserted))]
+
+    def eldest(self, n: Optional[int] = None) -> List[str]:
+        """Names of the n eldest grandchildren, eldest first, ties in insertion order. None
+        returns all of them."""
+        return [name for _, _, name in self.index[:n]]
+
+    def grandchildren(self) -> List[str]:
+        """Names of all grandchildren, child by child, as get_children returns them"""
+        return [name for records in self.children.values() for name, _, _ in records]
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Union[int, str]]]]:
+        return {
+            child: [{"name": name, "age": age} for name, age, _ in records]
+            for child, records in self.children.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
 ################################################################################
 # Pig Latin
 
@@ -163,13 +735,17 @@ def plfile(file_path: str) -> str:
     Args:
         file_path: Path to file
     """
-    with open(file_path, "r") as f:
-        result = " ".join(
-            word + "way" if word[0] in "aeiou" else word[1:] + word[0] + "ay"
-            for line in f
-            for word in line.rstrip().split(" ")
-        )
-        return result
+    # Attempt 1: Translates every word, however often it repeats
+    # with open(file_path, "r") as f:
+    #     result = " ".join(
+    #         word + "way" if word[0] in "aeiou" else word[1:] + word[0] + "ay"
+    #         for line in f
+    #         for word in line.rstrip().split(" ")
+    #     )
+    #     return result
+
+    # Attempt 2:
+    return funcfile(file_path, to_pig_latin)
 
 
 def to_pig_latin(string: str) -> str:
@@ -181,29 +757,241 @@ def to_pig_latin(string: str) -> str:
     return string + "way" if string[0] in "aeiou" else string[1:] + string[0] + "ay"
 
 
+def to_pig_latin_many(
+    words: Iterable[str], table: Optional[Dict[str, str]] = None
+) -> List[str]:
+    """Applies to_pig_latin to every word of a list or column. Each unique word is translated
+    once and looked up afterwards, which is about 5 times faster on text with repeated words
+    (and about 2 times slower when every word is unique).
+
+    Args:
+        words: Words to translate
+        table: Precomputed word -> translation dict, used and filled in place so it can be
+            reused across batches
+    """
+    table = {} if table is None else table
+    result = []
+    for word in words:
+        translation = table.get(word)
+        if translation is None:
+            translation = table[word] = (
+                word + "way" if word[0] in "aeiou" else word[1:] + word[0] + "ay"
+            )
+        result.append(translation)
+    return result
+
+
 def cap_every_odd_letter(string: str) -> str:
     """Capitalizes every other letter in the string argument.
 
     Args:
         string:
     """
+    # Attempt 1: A generator step and a modulo per character
+    # return "".join(
+    #     letter.upper() if (i + 1) % 2 == 1 else letter.lower()
+    #     for i, letter in enumerate(string)
+    # )
+
+    # Attempt 2: ASCII strings are lowercased whole, and their even characters replaced by the
+    # uppercased even slice. Other strings keep the per-character loop, since upper() can
+    # change their length (e.g. "ß" -> "SS")
+    if string.isascii():
+        letters = bytearray(string.lower(), "ascii")
+        letters[::2] = string[::2].upper().encode("ascii")
+        return letters.decode("ascii")
     return "".join(
-        letter.upper() if (i + 1) % 2 == 1 else letter.lower()
+        letter.upper() if i % 2 == 0 else letter.lower()
         for i, letter in enumerate(string)
     )
 
 
-def funcfile(file_path: str, func: Callable) -> str:
+def cap_every_odd_letter_many(strings: Iterable[str]) -> List[str]:
+    """Applies cap_every_odd_letter to every string of a list or column, as one batch: odd
+    length strings are padded with "\\x01" so each starts at an even offset, all are joined with
+    "\\0\\0", transformed at once like cap_every_odd_letter, then the padding is removed and the
+    result split. Falls back to one call per string for non-ASCII input, or input that
+    contains the padding or separator characters.
+
+    Args:
+        strings: Strings to transform
+    """
+    strings = list(strings)
+    if not strings:
+        return []
+    joined = "\0\0".join([s + "\x01" if len(s) & 1 else s for s in strings])
+    padding = len(joined) - sum(map(len, strings)) - 2 * (len(strings) - 1)
+    if (
+        not joined.isascii()
+        or joined.count("\0") != 2 * (len(strings) - 1)
+        or joined.count("\x01") != padding
+    ):
+        return [cap_every_odd_letter(s) for s in strings]
+    letters = bytearray(joined.lower(), "ascii")
+    letters[::2] = joined[::2].upper().encode("ascii")
+    return letters.decode("ascii").replace("\x01", "").split("\0\0")
+
+
+def funcfile(
+    file_path: str, func: Callable, memoize: bool = True, shared: bool = False
+) -> str:
     """Take two arguments--a filename and a function. Reads the text file from the file path and
     invokes the function on each word in the text file.
 
     Args:
         file_path: Path to file
         func: Function invoked on each word in the file
+        memoize: Call func once per unique word, through a cache private to this call. func
+            must then be a pure function of the word
+        shared: Use the process-wide cache of cached_word_function instead, so later calls
+            with the same module-level func reuse its results
     """
-    with open(file_path, "r") as f:
-        result = " ".join(func(word) for line in f for word in line.rstrip().split(" "))
-        return result
+    # Attempt 1: Calls func for every word, and joins all of them in one generator
+    # with open(file_path, "r") as f:
+    #     result = " ".join(func(word) for line in f for word in line.rstrip().split(" "))
+    #     return result
+
+    # Attempt 2:
+    return "".join(iter_funcfile(file_path, func, memoize=memoize, shared=shared))
+
+
+# Word caches shared by every call in this process (and so by every task a pool worker runs),
+# keyed by (func, maxsize). Only module-level functions get one, and only the most recently
+# used MAX_WORD_CACHES are kept, so lambdas and closures passed per call don't pile up.
+WORD_CACHES = OrderedDict()
+MAX_WORD_CACHES = 16
+
+
+def is_module_level(func: Callable) -> bool:
+    """Whether func is a plain module-level function or builtin, as opposed to a lambda,
+    closure, function defined inside another function or bound method. Bound methods depend on
+    their object's state, and a shared cache would keep the object alive."""
+    if inspect.ismethod(func) or not isinstance(
+        getattr(func, "__self__", None), (type(None), types.ModuleType)
+    ):
+        return False
+    qualname = getattr(func, "__qualname__", "<unknown>")
+    return "<" not in qualname and getattr(func, "__closure__", None) is None
+
+
+def cached_word_function(
+    func: Callable[[str], str], maxsize: int = 1 << 16, shared: bool = False
+) -> Callable[[str], str]:
+    """Wraps a per-word function in a bounded LRU cache, since real text repeats the same words
+    constantly. The wrapper's cache_info() reports hits and misses (see cache_hit_rate).
+
+    Args:
+        func: Pure function of a word
+        maxsize: Number of unique words cached
+        shared: Return the process-wide cache for (func, maxsize), creating it on first use,
+            instead of a new one. Ignored for lambdas, closures and bound methods, which
+            always get a new one
+    """
+    if not shared or not is_module_level(func):
+        return lru_cache(maxsize=maxsize)(func)
+    key = (func, maxsize)
+    cached = WORD_CACHES.get(key)
+    if cached is None:
+        cached = WORD_CACHES[key] = lru_cache(maxsize=maxsize)(func)
+        if len(WORD_CACHES) > MAX_WORD_CACHES:
+            WORD_CACHES.popitem(last=False)
+    else:
+        WORD_CACHES.move_to_end(key)
+    return cached
+
+
+def cache_hit_rate(cached: Callable) -> float:
+    """Fraction of calls to a cached_word_function wrapper answered from its cache"""
+    info = cached.cache_info()
+    calls = info.hits + info.misses
+    return info.hits / calls if calls else 0.0
+
+
+def transform_lines(lines: Iterable[str], func: Callable[[str], str]) -> Iterator[str]:
+    """Yields each line with func applied to each of its space separated words"""
+    for line in lines:
+        yield " ".join(map(func, line.rstrip().split(" ")))
+
+
+def transform_byte_range(
+    file_path: str,
+    start: int,
+    end: int,
+    func: Callable[[str], str],
+    memoize: bool,
+    shared: bool = False,
+) -> str:
+    """Transforms the words of one newline-aligned byte range of a file. Used as the worker of
+    iter_funcfile."""
+    if memoize:
+        func = cached_word_function(func, shared=shared)
+    return " ".join(transform_lines(read_byte_range(file_path, start, end), func))
+
+
+def iter_funcfile(
+    file_path: str,
+    func: Callable[[str], str],
+    memoize: bool = True,
+    workers: int = 1,
+    chunk_size: int = 1 << 26,
+    shared: bool = False,
+) -> Iterator[str]:
+    """Yields funcfile's result in pieces (a line, or with workers, a byte range of lines at a
+    time) so it can be streamed to disk instead of joined into one string.
+
+    Args:
+        file_path: Path to file
+        func: Function invoked on each word in the file. Must be a module-level function when
+            workers > 1
+        memoize: Call func once per unique word, as in funcfile. Each byte range gets its own
+            cache
+        workers: Number of worker processes. 1 runs in the calling process
+        chunk_size: Upper bound on the bytes a worker holds in memory at once
+        shared: Use the process-wide cache, as in funcfile. Each worker process has its own
+    """
+    if workers == 1:
+        if memoize:
+            func = cached_word_function(func, shared=shared)
+        with open(file_path, "r") as f:
+            pieces = transform_lines(f, func)
+            yield next(pieces, "")
+            for piece in pieces:
+                yield " " + piece
+        return
+    pieces = map_byte_ranges(
+        file_path,
+        transform_byte_range,
+        func,
+        memoize,
+        shared,
+        workers=workers,
+        chunk_size=chunk_size,
+    )
+    yield next(pieces, "")
+    for piece in pieces:
+        yield " " + piece
+
+
+def write_funcfile(
+    file_path: str,
+    write_path: str,
+    func: Callable[[str], str],
+    memoize: bool = True,
+    workers: int = 1,
+    shared: bool = False,
+) -> None:
+    """Writes funcfile's result to write_path, streamed piece by piece from iter_funcfile.
+
+    Args:
+        file_path: Path to file
+        write_path: Path to output file
+        func: Function invoked on each word in the file
+        memoize: Call func once per unique word
+        workers: Number of worker processes
+        shared: Use the process-wide cache, as in funcfile
+    """
+    with open(write_path, "w") as f:
+        f.writelines(iter_funcfile(file_path, func, memoize, workers, shared=shared))
 
 
 def dict_to_list_of_tuples(list_of_dicts: List[Dict[str, str]]) -> List[Tuple[str]]:
@@ -217,31 +1005,250 @@ def dict_to_list_of_tuples(list_of_dicts: List[Dict[str, str]]) -> List[Tuple[st
     return [(k, v) for dict_obj in list_of_dicts for k, v in dict_obj.items()]
 
 
-def get_most_common_score(list_of_dicts: List[Dict[str, List[int]]]):  # -> List[int]:
+class ScoreCounter:
+    """Streaming counter of the most common scores, fed one record or batch of scores at a time.
+    With capacity=None it counts exactly, using a Counter. With a capacity it keeps a
+    Misra-Gries summary of at most twice capacity scores: whenever more are tracked, the
+    (capacity + 1)-th largest count is subtracted from every count and the scores left at zero
+    or below are dropped. Counts are then underestimates by at most total / (capacity + 1), so
+    any score seen more often than that is kept.
+
+    Counters from separate workers are combined with merge. Merging two summaries and pruning
+    keeps the same error bound, so a counter can be built per file or per batch and merged.
+    """
+
+    def __init__(self, k: int = 3, capacity: Optional[int] = None):
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if capacity is not None and capacity < k:
+            raise ValueError(f"capacity must be at least k ({k}), got {capacity}")
+        self.k = k
+        self.capacity = capacity
+        self.counts = Counter()
+        self.total = 0
+
+    def update(self, scores: Iterable[int]) -> None:
+        """Counts a batch of scores"""
+        if not isinstance(scores, (list, tuple)):
+            scores = list(scores)
+        self.counts.update(scores)
+        self.total += len(scores)
+        # Pruning only once twice the capacity is tracked makes it amortized O(1) per score
+        if self.capacity is not None and len(self.counts) > 2 * self.capacity:
+            self.prune()
+
+    def add(self, record: Dict[str, Any], field: Optional[str] = "values") -> None:
+        """Counts the scores of one record: the list in its field, or with field=None, the
+        lists in all of its values"""
+        if field is not None:
+            self.update(record[field])
+        else:
+            for scores in record.values():
+                self.update(scores)
+
+    def add_many(
+        self,
+        records: Iterable[Dict[str, Any]],
+        field: Optional[str] = "values",
+        batch_size: int = 4096,
+    ) -> None:
+        """Counts the scores of many records, like add, batch_size records per update"""
+        for batch in iter_batches(records, batch_size):
+            if field is not None:
+                lists = map(itemgetter(field), batch)
+            else:
+                lists = chain.from_iterable(map(dict.values, batch))
+            self.update(list(chain.from_iterable(lists)))
+
+    def prune(self) -> None:
+        if self.capacity is None or len(self.counts) <= self.capacity:
+            return
+        cutoff = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.counts = Counter(
+            {
+                score: count - cutoff
+                for score, count in self.counts.items()
+                if count > cutoff
+            }
+        )
+
+    def merge(self, other: "ScoreCounter") -> "ScoreCounter":
+        """Adds the counts of another counter (e.g. a worker's partial counter) to this one"""
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.prune()
+        return self
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[int, int]]:
+        """The n (by default k) most common scores and their counts, most common first"""
+        self.prune()
+        return self.counts.most_common(self.k if n is None else n)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+def get_most_common_score(
+    list_of_dicts: Iterable[Dict[str, Any]],
+    k: int = 3,
+    field: Optional[str] = "values",
+    capacity: Optional[int] = None,
+) -> List[Tuple[int, int]]:
     """Reads a list of dicts, in which each dict contains two name-value pairs: name and values,
     where name is the person’s name and values is a list of strings representing the person’s
-    test scores. Returns the the 3 most common scores among the people listed in the dicts.
+    test scores. Returns the the k most common scores among the people listed in the dicts.
 
     Args:
-        list_of_dicts: List of dictionary object, each containing a username and list of scores.
+        list_of_dicts: List or iterable of dictionary objects, each containing a username and
+            list of scores. Records are consumed one at a time.
+        k: Number of scores to return
+        field: Key of the list of scores in each dict. None counts the lists in every value,
+            for dicts of name -> scores.
+        capacity: Number of scores to track, bounding memory, for approximate counts. None
+            counts exactly.
     """
-    return Counter(
-        score
-        for dict_obj in list_of_dicts
-        for _, scores in dict_obj.items()
-        for score in scores
-    ).most_common(3)
+    # Attempt 1: Walks every key of every dict, and needs the whole list in memory
+    # return Counter(
+    #     score
+    #     for dict_obj in list_of_dicts
+    #     for _, scores in dict_obj.items()
+    #     for score in scores
+    # ).most_common(3)
+
+    # Attempt 2: Streams the records into a ScoreCounter
+    counter = ScoreCounter(k, capacity)
+    counter.add_many(list_of_dicts, field)
+    return counter.most_common()
+
+
+def count_score_batch(
+    records: List[Dict[str, Any]], k: int, field: Optional[str], capacity: Optional[int]
+) -> ScoreCounter:
+    """Counts a batch of records into a new ScoreCounter (one pool task)"""
+    counter = ScoreCounter(k, capacity)
+    counter.add_many(records, field)
+    return counter
+
+
+def get_most_common_score_parallel(
+    records: Iterable[Dict[str, Any]],
+    k: int = 3,
+    field: Optional[str] = "values",
+    capacity: Optional[int] = None,
+    workers: Optional[int] = None,
+    batch_size: int = 10000,
+) -> List[Tuple[int, int]]:
+    """Like get_most_common_score, with batches of records counted in a process pool and the
+    partial counters merged. At most twice as many batches as workers are in flight at once, so
+    records are read from the iterable only as fast as the pool counts them.
+
+    Args:
+        records: Iterable of dictionary objects, each containing a username and list of scores
+        k: Number of scores to return
+        field: Key of the list of scores in each dict, or None for every value
+        capacity: Number of scores to track per counter, or None for exact counts
+        workers: Number of worker processes. Defaults to the number of CPUs
+        batch_size: Number of records per task
+    """
+    workers = workers or os.cpu_count() or 1
+    counter = ScoreCounter(k, capacity)
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for batch in iter_batches(records, batch_size):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counter.merge(future.result())
+            pending.add(executor.submit(count_score_batch, batch, k, field, capacity))
+        for future in pending:
+            counter.merge(future.result())
+    return counter.most_common()
 
 
 ################################################################################
 # Flip Dict
 
+# Sentinel for lookups where None is a valid key
+MISSING = object()
+
 
 def flip_dict(dict_obj: Dict[any, any]) -> Dict[any, any]:
     """Given a dictionary object, returns the object with keys and values inverted"""
     return {v: k for k, v in dict_obj.items()}
 
 
+class BiDict(MutableMapping):
+    """Dict with an inverse kept up to date as it changes, for O(1) lookups of the key of a value
+    without rebuilding flip_dict. Values must be hashable and unique: assigning a value that
+    already belongs to another key raises ValueError instead of silently dropping that key, as
+    flip_dict does.
+
+    The forward and inverse dicts share their key and value objects, and inverse returns a
+    BiDict over the same two dicts swapped, so the whole mapping costs two hash tables however
+    often it's inverted.
+
+    Args:
+        mapping: Initial key -> value mapping
+    """
+
+    __slots__ = ("forward", "backward", "inverse_view")
+
+    def __init__(self, mapping: Optional[Dict[Any, Any]] = None):
+        self.forward = dict(mapping or {})
+        # Built in C, like flip_dict but without a Python-level loop; a size mismatch means
+        # some value belongs to more than one key
+        self.backward = dict(zip(self.forward.values(), self.forward.keys()))
+        self.inverse_view = None
+        if len(self.backward) != len(self.forward):
+            for key, value in self.forward.items():
+                if self.backward[value] != key:
+                    raise ValueError(
+                        f"value {value!r} belongs to both {key!r} and "
+                        f"{self.backward[value]!r}"
+                    )
+
+    @property
+    def inverse(self) -> "BiDict":
+        """Live value -> key view of this BiDict"""
+        if self.inverse_view is None:
+            inverse = BiDict.__new__(BiDict)
+            inverse.forward, inverse.backward = self.backward, self.forward
+            inverse.inverse_view = self
+            self.inverse_view = inverse
+        return self.inverse_view
+
+    def key_of(self, value: Any) -> Any:
+        """Returns the key of value. Raises KeyError if no key has that value."""
+        return self.backward[value]
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.forward[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        owner = self.backward.get(value, MISSING)
+        if owner is not MISSING and owner != key:
+            raise ValueError(f"value {value!r} already belongs to {owner!r}")
+        if key in self.forward:
+            del self.backward[self.forward[key]]
+        self.forward[key] = value
+        self.backward[value] = key
+
+    def __delitem__(self, key: Any) -> None:
+        del self.backward[self.forward.pop(key)]
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.forward
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.forward)
+
+    def __len__(self) -> int:
+        return len(self.forward)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.forward!r})"
+
+
 def count_vowels(word: str) -> int:
     """Returns the number of vowels in a word"""
     # Attempt 1:
@@ -284,10 +1291,15 @@ def get_filename_and_size(dir: str) -> Dict[str, int]:
     Args:
         dir: Path to directory
     """
-    return {
-        pathlib.Path(fp).name: pathlib.Path(fp).stat().st_size
-        for fp in pathlib.Path(dir).iterdir()
-    }
+    # Attempt 1: Builds two Path objects per entry
+    # return {
+    #     pathlib.Path(fp).name: pathlib.Path(fp).stat().st_size
+    #     for fp in pathlib.Path(dir).iterdir()
+    # }
+
+    # Attempt 2:
+    with os.scandir(dir) as entries:
+        return {entry.name: entry.stat().st_size for entry in entries}
 
 
 ################################################################################
@@ -331,12 +1343,16 @@ def get_passwd_shells(file_path: str) -> Set[str]:
     Args:
         file_path: Path to file
     """
-    with open(file_path, "r") as f:
-        return set(
-            line.strip().split(":")[-1]
-            for line in f
-            if line.strip() and "#" not in line[0]
-        )
+    # Attempt 1: Parses the file on every call
+    # with open(file_path, "r") as f:
+    #     return set(
+    #         line.strip().split(":")[-1]
+    #         for line in f
+    #         if line.strip() and "#" not in line[0]
+    #     )
+
+    # Attempt 2: Reuses the parsed and shell-indexed passwd records
+    return set(load_passwd(file_path).by_shell)
 
 
 def get_word_lengths(file_path: str) -> Dict[int, Set[str]]:
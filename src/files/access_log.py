@@ -0,0 +1,180 @@
+import re
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from src.files.files import follow, map_byte_ranges, read_byte_range
+
+################################################################################
+# Access log parsing
+
+# Apache combined log format. Lines in data/log.txt are additionally wrapped in double quotes,
+# so a leading and trailing quote are allowed. The request line is "-" when the client sent
+# none (e.g. 408 responses).
+LOG_PATTERN = re.compile(
+    r'"?(?P<ip>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    r'"(?:(?P<method>\S+) (?P<path>\S+)[^"]*|-)" '
+    r"(?P<status>\d{3}) (?P<bytes_sent>\d+|-) "
+    r'"[^"]*" "(?P<user_agent>.*?)""?\s*$'
+)
+
+
+class LogRecord(NamedTuple):
+    ip: str
+    time: str  # e.g. "22/Dec/2016:22:32:31 +0300"
+    method: str
+    path: str
+    status: int
+    bytes_sent: int
+    user_agent: str
+
+    @property
+    def minute(self) -> datetime:
+        """The minute the request was made in, as a timezone-aware datetime"""
+        return parse_minute(self.time[:17] + self.time[20:])
+
+
+@lru_cache(maxsize=4096)
+def parse_minute(minute: str) -> datetime:
+    """Parses "22/Dec/2016:22:32 +0300". Cached, since consecutive log lines share their
+    minute."""
+    return datetime.strptime(minute, "%d/%b/%Y:%H:%M %z")
+
+
+def parse_line(line: str) -> Optional[LogRecord]:
+    """Parses one access log line into a LogRecord. Returns None for malformed lines, including
+    lines whose timestamp can't be parsed. Method and path are "-" when the request line is.
+
+    Args:
+        line: Line in Apache combined log format
+    """
+    match = LOG_PATTERN.match(line)
+    if match is None:
+        return None
+    ip, time, method, path, status, bytes_sent, user_agent = match.groups()
+    # The pattern accepts anything between the brackets; a bad timestamp makes the line
+    # malformed here rather than failing later in LogReport.add
+    try:
+        parse_minute(time[:17] + time[20:])
+    except ValueError:
+        return None
+    return LogRecord(
+        ip,
+        time,
+        method or "-",
+        path or "-",
+        int(status),
+        0 if bytes_sent == "-" else int(bytes_sent),
+        user_agent,
+    )
+
+
+def iter_log(file_path: str) -> Iterator[LogRecord]:
+    """Streams the well-formed records of an access log file, skipping malformed lines.
+
+    Args:
+        file_path: Path to access log
+    """
+    with open(file_path, "r") as f:
+        for line in f:
+            record = parse_line(line)
+            if record is not None:
+                yield record
+
+
+def follow_log(file_path: str, **follow_kwargs) -> Iterator[LogRecord]:
+    """Yields the well-formed records appended to a live access log, following rotation and
+    truncation. Keyword arguments are passed on to files.follow.
+
+    Args:
+        file_path: Path to access log
+    """
+    records = map(parse_line, follow(file_path, **follow_kwargs))
+    return (record for record in records if record is not None)
+
+
+################################################################################
+# Access log reports
+
+
+class LogReport:
+    """Aggregated access log statistics. Memory grows with the number of distinct IPs, paths,
+    statuses and minutes, not with the number of lines. Reports built from separate parts of a
+    log can be combined with merge."""
+
+    def __init__(self):
+        self.requests_per_ip = Counter()
+        self.status_counts = Counter()
+        self.bytes_per_path = Counter()
+        self.requests_per_minute = Counter()
+        self.malformed = 0
+
+    def add(self, record: LogRecord) -> None:
+        self.requests_per_ip[record.ip] += 1
+        self.status_counts[record.status] += 1
+        self.bytes_per_path[record.path] += record.bytes_sent
+        self.requests_per_minute[record.minute] += 1
+
+    def add_lines(self, lines: Iterable[str]) -> "LogReport":
+        """Parses and adds every line. Malformed lines are counted, not added, and blank lines
+        are ignored."""
+        for line in lines:
+            record = parse_line(line)
+            if record is not None:
+                self.add(record)
+            elif line.strip():
+                self.malformed += 1
+        return self
+
+    def merge(self, other: "LogReport") -> "LogReport":
+        self.requests_per_ip.update(other.requests_per_ip)
+        self.status_counts.update(other.status_counts)
+        self.bytes_per_path.update(other.bytes_per_path)
+        self.requests_per_minute.update(other.requests_per_minute)
+        self.malformed += other.malformed
+        return self
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.status_counts.values())
+
+    def top_ips(self, n: int = 10) -> List[Tuple[str, int]]:
+        return self.requests_per_ip.most_common(n)
+
+    def top_paths_by_bytes(self, n: int = 10) -> List[Tuple[str, int]]:
+        return self.bytes_per_path.most_common(n)
+
+    def per_minute_rates(self) -> Dict[datetime, int]:
+        """Requests per minute, in chronological order"""
+        return dict(sorted(self.requests_per_minute.items()))
+
+
+def analyze_log_range(file_path: str, start: int, end: int) -> LogReport:
+    """Builds a LogReport for one byte range of a log. Used as the worker of analyze_log."""
+    return LogReport().add_lines(read_byte_range(file_path, start, end))
+
+
+def analyze_log(
+    file_path: str, workers: int = 1, chunk_size: int = 1 << 26
+) -> LogReport:
+    """Streams an access log into a LogReport.
+
+    With more than one worker, the log is split into newline-aligned byte ranges of at most
+    chunk_size bytes, each range is reported on in a pool of processes, and the partial reports
+    are merged.
+
+    Args:
+        file_path: Path to access log
+        workers: Number of worker processes. 1 runs in the calling process
+        chunk_size: Upper bound on the bytes a worker holds in memory at once
+    """
+    if workers == 1:
+        with open(file_path, "r") as f:
+            return LogReport().add_lines(f)
+    report = LogReport()
+    for part in map_byte_ranges(
+        file_path, analyze_log_range, workers=workers, chunk_size=chunk_size
+    ):
+        report.merge(part)
+    return report
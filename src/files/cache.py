@@ -0,0 +1,207 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import types
+from typing import Any, Callable, Optional
+
+################################################################################
+# Persistent result cache
+
+
+class ResultCache:
+    """SQLite-backed store of pickled function results with least-recently-used eviction.
+    Once the stored results add up to more than max_bytes, the least recently used ones are
+    deleted.
+
+    Each thread (and each process, after a fork) gets its own connection, so one cache can be
+    shared by the thread and process pools in files.py.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 256 << 20):
+        self.db_path = os.fspath(db_path)
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                    "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+                )
+                # Running total of the sizes in results, so set doesn't sum the whole table.
+                # Kept in the database, since several processes can share one cache
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS total_size ("
+                    "id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+                )
+                connection.execute(
+                    "INSERT OR IGNORE INTO total_size "
+                    "SELECT 0, TOTAL(size) FROM results"
+                )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        connection = self.connect()
+        with connection:
+            row = connection.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        connection = self.connect()
+        with connection:
+            row = connection.execute(
+                "SELECT size FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            connection.execute(
+                "UPDATE total_size SET size = size + ?",
+                (len(blob) - (row[0] if row else 0),),
+            )
+            self.evict(connection)
+
+    def evict(self, connection: sqlite3.Connection) -> None:
+        """Deletes the least recently used results until the rest fit in max_bytes"""
+        (total,) = connection.execute("SELECT size FROM total_size").fetchone()
+        if total <= self.max_bytes:
+            return
+        stale = []
+        freed = 0
+        for key, size in connection.execute(
+            "SELECT key, size FROM results ORDER BY last_used"
+        ):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        connection.executemany("DELETE FROM results WHERE key = ?", stale)
+        connection.execute("UPDATE total_size SET size = size - ?", (freed,))
+
+    def clear(self) -> None:
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM results")
+            connection.execute("UPDATE total_size SET size = 0")
+
+    def __len__(self) -> int:
+        return self.connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+# Caching is off unless a cache is configured, either with the FILES_CACHE_PATH environment
+# variable or with set_result_cache
+RESULT_CACHE = (
+    ResultCache(os.environ["FILES_CACHE_PATH"])
+    if os.environ.get("FILES_CACHE_PATH")
+    else None
+)
+
+
+def set_result_cache(cache: Optional[ResultCache]) -> None:
+    """Sets the cache used by functions decorated with cache_file_result. None turns caching
+    off."""
+    global RESULT_CACHE
+    RESULT_CACHE = cache
+
+
+# Part of every cache key. Bump it to invalidate every stored result, e.g. after changing a
+# helper that decorated functions call
+CACHE_VERSION = 1
+
+
+def code_digest(code: types.CodeType) -> str:
+    """Digest of a code object's bytecode and constants that is the same in every process.
+    Nested code objects (comprehensions, lambdas) are digested recursively, since their repr
+    contains a memory address, and frozensets are sorted, since their order depends on string
+    hash randomization."""
+    digest = hashlib.sha256(code.co_code)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            digest.update(code_digest(const).encode())
+        elif isinstance(const, frozenset):
+            digest.update(repr(sorted(map(repr, const))).encode())
+        else:
+            digest.update(repr(const).encode())
+    return digest.hexdigest()
+
+
+def cache_file_result(func: Optional[Callable] = None, *, version: int = 0) -> Callable:
+    """Decorator for functions whose first argument is a file path. Results are stored in
+    RESULT_CACHE, keyed by the function, the file's absolute path, size and mtime_ns, and the
+    remaining arguments, so a result is reused until the file changes. Calls go straight to
+    func when caching is off or the path can't be stat'ed.
+
+    Keys also include CACHE_VERSION, the version argument and a digest of func's bytecode and
+    constants, so results stored by an older implementation of func aren't returned. Use as
+    @cache_file_result or @cache_file_result(version=2).
+
+    Args:
+        func: Function to decorate
+        version: Version of func, to bump when its results change without its code changing
+    """
+    if func is None:
+        return functools.partial(cache_file_result, version=version)
+    name = f"{func.__module__}.{func.__qualname__}"
+    code = getattr(func, "__code__", None)
+    salt = (CACHE_VERSION, version, code_digest(code) if code else "")
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = RESULT_CACHE
+        if cache is None:
+            return func(*args, **kwargs)
+        try:
+            bound = signature.bind(*args, **kwargs)
+        except TypeError:
+            # Let func raise its own error for bad arguments
+            return func(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = list(bound.arguments.items())
+        (_, file_path), rest = arguments[0], arguments[1:]
+        try:
+            stat = os.stat(file_path)
+        except (OSError, TypeError, ValueError):
+            return func(*args, **kwargs)
+        key = hashlib.sha256(
+            repr(
+                (
+                    name,
+                    salt,
+                    os.path.abspath(file_path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    rest,
+                )
+            ).encode()
+        ).hexdigest()
+        missing = object()
+        result = cache.get(key, missing)
+        if result is missing:
+            result = func(*args, **kwargs)
+            cache.set(key, result)
+        return result
+
+    return wrapper
@@ -1,25 +1,196 @@
 import csv
+import hashlib
+import heapq
+import io
 import json
 import logging
+import mmap
 import os
 import pathlib
 import re
-from collections import defaultdict
-from functools import reduce
-from typing import Dict, List
-
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from itertools import islice
+from math import prod
+from operator import add
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from src.files.cache import cache_file_result
 
 ################################################################################
 # Final Line
 
 
-def final_line(file_path: str) -> str:
-    """Takes a filename as an argument and returns that file’s final line"""
-    with open(file_path) as f:
-        last_line = ""
-        for _ in f:
-            last_line = f.readline()
-        return last_line
+def final_line(file_path: str, encoding: str = "utf-8") -> str:
+    """Takes a filename as an argument and returns that file’s final line, without its trailing
+    newline. Reads backwards from the end of the file, so the cost depends on the length of the
+    final line rather than the size of the file.
+
+    Args:
+        file_path: Path to text file
+        encoding: Encoding used to decode the final line
+    """
+    # Attempt 1: Reads the whole file, and skips every other line because of the readline()
+    # with open(file_path) as f:
+    #     last_line = ""
+    #     for _ in f:
+    #         last_line = f.readline()
+    #     return last_line
+
+    # Attempt 2:
+    lines = last_lines(file_path, 1, encoding=encoding)
+    return lines[0] if lines else ""
+
+
+def last_lines(
+    file_path: str, n: int, encoding: str = "utf-8", block_size: int = 8192
+) -> List[str]:
+    """Returns the final n lines of a file (oldest first), without their trailing newlines. A
+    file of at least one line always gives min(n, lines) of them, so "\\n" gives [""].
+    The file is opened in binary mode and read backwards in blocks of block_size bytes until n
+    newlines have been seen, so only the tail of the file is ever read or decoded.
+
+    Args:
+        file_path: Path to text file
+        n: Number of lines to return
+        encoding: Encoding used to decode the lines
+        block_size: Number of bytes read per backward step
+    """
+    if n <= 0:
+        return []
+    with open(file_path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        if pos == 0:
+            return []
+        blocks = []
+        newlines = 0
+        while pos > 0 and newlines < n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            newlines += block.count(b"\n")
+            # A trailing newline ends the final line rather than starting an empty one
+            if not blocks and block.endswith(b"\n"):
+                block = block[:-1]
+                newlines -= 1
+            blocks.append(block)
+    tail = b"".join(reversed(blocks))
+    lines = tail.split(b"\n")[-n:]
+    return [line.rstrip(b"\r").decode(encoding) for line in lines]
+
+
+################################################################################
+# Follow
+
+
+def follow(
+    file_path: str,
+    from_start: bool = False,
+    poll_interval: float = 1.0,
+    idle_timeout: Optional[float] = None,
+    block_size: int = 1 << 16,
+    encoding: str = "utf-8",
+) -> Iterator[str]:
+    """Yields lines as they are appended to a file, like `tail -F`. Lines are yielded without
+    their trailing newline, and an incomplete final line is held back until it is finished.
+
+    The file is read in binary blocks from a remembered byte offset, so nothing is read twice.
+    When no new data is available, the path is stat'ed to detect:
+        rotation: the path now points to a different inode. The old file has already been
+            read to the end, so the new file is opened and followed from its start.
+        truncation: the file is now smaller than the offset, so reading restarts at 0.
+
+    Args:
+        file_path: Path to file
+        from_start: Yield the lines already in the file first, instead of starting at its end
+        poll_interval: Seconds to sleep when there's no new data
+        idle_timeout: Stop after this many seconds without new data. None follows forever
+        block_size: Number of bytes read per call
+        encoding: Encoding used to decode the lines
+    """
+    # Open and position the file now, rather than on the generator's first next(), so lines
+    # appended after follow() returns are never missed
+    f = open(file_path, "rb")
+    if not from_start:
+        f.seek(0, os.SEEK_END)
+    return follow_open_file(
+        f, file_path, poll_interval, idle_timeout, block_size, encoding
+    )
+
+
+def follow_open_file(
+    f: BinaryIO,
+    file_path: str,
+    poll_interval: float,
+    idle_timeout: Optional[float],
+    block_size: int,
+    encoding: str,
+) -> Iterator[str]:
+    """The polling loop of follow, reading f from its current position"""
+    inode = os.fstat(f.fileno()).st_ino
+    pending = b""
+    last_data = time.monotonic()
+    try:
+        while True:
+            block = f.read(block_size)
+            if block:
+                *lines, pending = (pending + block).split(b"\n")
+                for line in lines:
+                    yield line.rstrip(b"\r").decode(encoding)
+                last_data = time.monotonic()
+                continue
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                stat = None  # Mid-rotation: wait for the new file to appear
+            if stat is not None and stat.st_ino != inode:
+                try:
+                    rotated = open(file_path, "rb")
+                except FileNotFoundError:
+                    time.sleep(poll_interval)
+                    continue
+                if pending:
+                    yield pending.rstrip(b"\r").decode(encoding)
+                    pending = b""
+                f.close()
+                f = rotated
+                inode = os.fstat(f.fileno()).st_ino
+                continue
+            if stat is not None and stat.st_size < f.tell():
+                f.seek(0)
+                pending = b""
+                continue
+            if (
+                idle_timeout is not None
+                and time.monotonic() - last_data >= idle_timeout
+            ):
+                return
+            time.sleep(poll_interval)
+    finally:
+        f.close()
 
 
 ################################################################################
@@ -36,20 +207,147 @@ def sum_multi_columns(file_path: str) -> int:
     """Reads a two-column TSV. Multiplies each first number by the second,
     and then sums the results from all the lines.  Ignores any line that
     doesn’t contain two or more numeric columns."""
-    with open(file_path, "r") as f:
-        nums = []
+    # Attempt 1: Keeps every product in a list before summing
+    # with open(file_path, "r") as f:
+    #     nums = []
+    #     for line in f:
+    #         split = line.rstrip().split("\t")
+    #         if len(split) >= 2:
+    #             line = [int(i) for i in split]
+    #             nums.append(reduce(lambda x, y: x * y, line))
+    #     return sum(nums)
+
+    # Attempt 2:
+    return reduce_columns(file_path)
+
+
+COLUMN_REDUCERS = {"column_sum": add, "min": min, "max": max}
+
+
+@cache_file_result
+def reduce_columns(
+    file_path: str,
+    columns: Optional[Sequence[int]] = None,
+    reduction: str = "product_sum",
+    buffer_size: int = 1 << 20,
+) -> Union[int, List[int]]:
+    """Streams a TSV of integer columns and reduces it in constant memory: only running totals
+    are kept, never the parsed lines. Lines with fewer than two columns, or missing one of the
+    selected columns, are ignored.
+
+    Reductions:
+        product_sum: multiplies the columns of each line and sums the products (an int)
+        column_sum: sums each column (a list of ints, one per column)
+        min / max: smallest / largest value of each column (a list of ints, one per column)
+
+    Args:
+        file_path: Path to TSV file
+        columns: Indexes of the columns to use, negative ones counting from the end of each
+            line. Defaults to every column on the line
+        reduction: "product_sum", or one of the COLUMN_REDUCERS
+        buffer_size: Size in bytes of the read buffer
+    """
+    if reduction != "product_sum" and reduction not in COLUMN_REDUCERS:
+        raise ValueError(f"Unknown reduction {reduction!r}")
+    # Column i needs i + 1 columns, or -i columns when it counts from the end
+    min_width = max([2] + [i + 1 if i >= 0 else -i for i in columns or []])
+    total = 0
+    per_column = []
+    with open(file_path, "r", buffering=buffer_size) as f:
         for line in f:
-            split = line.rstrip().split("\t")
-            if len(split) >= 2:
-                line = [int(i) for i in split]
-                nums.append(reduce(lambda x, y: x * y, line))
-        return sum(nums)
+            row = line.rstrip().split("\t")
+            if len(row) < min_width:
+                continue
+            if columns:
+                row = [row[i] for i in columns]
+            if reduction == "product_sum":
+                total += prod(map(int, row))
+                continue
+            values = list(map(int, row))
+            reduced = list(map(COLUMN_REDUCERS[reduction], per_column, values))
+            per_column[: len(reduced)] = reduced
+            per_column.extend(values[len(reduced) :])
+    return total if reduction == "product_sum" else per_column
 
 
 ################################################################################
 # /etc/passwd to dict
 
 
+class PasswdDatabase:
+    """Records of a passwd-format file, parsed once and indexed for O(1) lookups.
+
+    Every non-blank, non-comment line becomes a tuple of its ":"-separated fields. Well-formed
+    entries have 7 fields (username, password, UID, GID, GECOS, home directory, shell), but
+    shorter lines are kept so callers can decide how strict to be. Repeated field values (shells,
+    home directories) are interned so they're only stored once.
+    """
+
+    def __init__(self, records: List[Tuple[str, ...]]):
+        self.records = records
+        self.by_name = {record[0]: record for record in records}
+        self.by_uid = {
+            int(record[2]): record
+            for record in records
+            if len(record) > 2 and record[2].lstrip("-").isdigit()
+        }
+        # The last field is the shell for well-formed entries. Usernames are kept in tuples,
+        # since databases are cached and shared by every caller of load_passwd
+        by_shell = defaultdict(list)
+        for record in records:
+            by_shell[record[-1]].append(record[0])
+        self.by_shell = {shell: tuple(names) for shell, names in by_shell.items()}
+
+    @classmethod
+    def from_file(cls, file_path: str, encoding: str = "utf-8") -> "PasswdDatabase":
+        """Memory-maps a passwd-format file and parses it"""
+        records = []
+        if os.path.getsize(file_path) == 0:  # mmap can't map an empty file
+            return cls(records)
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            for line in iter(mm.readline, b""):
+                line = line.strip()
+                if not line or line.startswith(b"#"):
+                    continue
+                records.append(tuple(map(sys.intern, line.decode(encoding).split(":"))))
+        return cls(records)
+
+    def get_user(self, username: str) -> Optional[Tuple[str, ...]]:
+        """Returns the record of a username, or None"""
+        return self.by_name.get(username)
+
+    def get_uid(self, uid: int) -> Optional[Tuple[str, ...]]:
+        """Returns the record of a UID, or None"""
+        return self.by_uid.get(int(uid))
+
+    def users_with_shell(self, shell: str) -> Tuple[str, ...]:
+        """Returns the usernames whose shell is `shell`"""
+        return self.by_shell.get(shell, ())
+
+
+PASSWD_CACHE: Dict[str, Tuple[Tuple[int, int], PasswdDatabase]] = {}
+
+
+def load_passwd(file_path: str) -> PasswdDatabase:
+    """Returns the PasswdDatabase of a passwd-format file. Databases are cached per path and
+    reused until the file's mtime or size changes, so repeated calls only cost an os.stat.
+
+    Args:
+        file_path: Path to /etc/passwd file
+    """
+    stat = os.stat(file_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = os.path.abspath(file_path)
+    cached = PASSWD_CACHE.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    db = PasswdDatabase.from_file(file_path)
+    PASSWD_CACHE[key] = (stamp, db)
+    return db
+
+
 def passwd_to_dict(file_path: str) -> Dict[any, Dict[str, str]]:
     """Returns a dict based on /etc/passwd in which the dict’s keys are
     usernames and the values are dicts with keys (and
@@ -62,17 +360,27 @@ def passwd_to_dict(file_path: str) -> Dict[any, Dict[str, str]]:
     The first field (index 0) is the username (e.g. nobody), and the third
     field (index 2) is the user’s unique ID number (e.g. -2.
     """
-    with open(file_path, "r") as f:
-        users = {}
-        for line in f:
-            try:
-                fields = line.strip().split(":")
-                user, id, home_dir, shell = fields[0], fields[2], fields[5], fields[6]
-            except IndexError:
-                logging.warning(f"{fields} has unexpected format, skipping")
-                continue
-            users[user] = {"id": id, "home_dir": home_dir, "shell": shell}
-        return users
+    # Attempt 1: Parses the file on every call
+    # with open(file_path, "r") as f:
+    #     users = {}
+    #     for line in f:
+    #         try:
+    #             fields = line.strip().split(":")
+    #             user, id, home_dir, shell = fields[0], fields[2], fields[5], fields[6]
+    #         except IndexError:
+    #             logging.warning(f"{fields} has unexpected format, skipping")
+    #             continue
+    #         users[user] = {"id": id, "home_dir": home_dir, "shell": shell}
+    #     return users
+
+    # Attempt 2:
+    users = {}
+    for fields in load_passwd(file_path).records:
+        if len(fields) < 7:
+            logging.warning(f"{list(fields)} has unexpected format, skipping")
+            continue
+        users[fields[0]] = {"id": fields[2], "home_dir": fields[5], "shell": fields[6]}
+    return users
 
 
 ################################################################################
@@ -95,6 +403,61 @@ def count_chars(word_list: List[str]) -> int:
     return count
 
 
+class Normalizer:
+    """Basic word token normalization such as lowercase, stripping newline, white space delimited
+    tokenization. URLs are replaced with "<URL>", and doubled or more complex punctuation is
+    simplified (the exception is '...').
+
+    All regexes are compiled once, when the Normalizer is created. normalize_many joins a batch
+    of lines into a single string so each regex scans the whole batch in one call, and skips the
+    passes that a cheap substring check shows can't match.
+    """
+
+    URL_REGEX = (
+        r"(https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,"
+        r"}|www\.[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|https?:\/\/(?:www\.|("
+        r"?!www))[a-zA-Z0-9]+\.[^\s]{2,}|www\.[a-zA-Z0-9]+\.[^\s]{2,})"
+    )
+    PUNCTUATION = "!?,;"
+
+    def __init__(self):
+        self.url_regex = re.compile(self.URL_REGEX)
+        # One literal-prefixed regex per character is much faster than the equivalent
+        # r"([!?,;])\1+" with a backreference
+        self.repeated_punctuation = [
+            (char * 2, re.compile(re.escape(char) * 2 + "+"), char)
+            for char in self.PUNCTUATION
+        ]
+        self.ellipsis_regex = re.compile(r"\.\.+")
+
+    def simplify(self, text: str) -> str:
+        """Replaces URLs and simplifies punctuation in already lowercased text"""
+        if "www." in text or "http" in text:
+            text = self.url_regex.sub("<URL>", text)
+        for doubled, regex, char in self.repeated_punctuation:
+            if doubled in text:
+                text = regex.sub(char, text)
+        if ".." in text:
+            text = self.ellipsis_regex.sub("...", text)
+        return text
+
+    def __call__(self, text: str) -> List[str]:
+        """Returns the normalized word tokens of a single line"""
+        return self.simplify(text.strip().lower()).split(" ")
+
+    def normalize_many(self, lines: Iterable[str]) -> List[List[str]]:
+        """Returns the normalized word tokens of each line in a batch of lines. Lines may end
+        with a newline, but must not contain any other newline."""
+        stripped = [line.strip() for line in lines]
+        if not stripped:
+            return []
+        text = self.simplify("\n".join(stripped).lower())
+        return [line.split(" ") for line in text.split("\n")]
+
+
+NORMALIZER = Normalizer()
+
+
 def normalize(text):
     """Do basic word token normalization such as lowercase, stripping
     newline, white space delimited tokenization.
@@ -105,37 +468,65 @@ def normalize(text):
     Returns:
         tokens (List[str]): a list of normalized word tokens
     """
+    # Attempt 1: Rebuilds the URL regex and runs three re.sub passes on every call
+    # def _replace_urls(text):
+    #     url_regex = (...)
+    #     text = re.sub(url_regex, "<URL>", text)
+    #     return text
+    #
+    # def _simplify_punctuation(text):
+    #     corrected = str(text)
+    #     corrected = re.sub(r"([!?,;])\1+", r"\1", corrected)
+    #     corrected = re.sub(r"\.{2,}", r"...", corrected)
+    #     return corrected
+    #
+    # text = text.strip().lower()
+    # text = _replace_urls(text)
+    # text = _simplify_punctuation(text)
+    # return text.split(" ")
 
-    def _replace_urls(text):
-        url_regex = (
-            r"(https?:\/\/(?:www\.|(?!www))[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,"
-            r"}|www\.[a-zA-Z0-9][a-zA-Z0-9-]+[a-zA-Z0-9]\.[^\s]{2,}|https?:\/\/(?:www\.|("
-            r"?!www))[a-zA-Z0-9]+\.[^\s]{2,}|www\.[a-zA-Z0-9]+\.[^\s]{2,})"
-        )
-        text = re.sub(url_regex, "<URL>", text)
-        return text
+    # Attempt 2:
+    return NORMALIZER(text)
 
-    def _simplify_punctuation(text):
-        """
-        This functions simplifies doubled or more complex punctuation. The exception is '...'.
-        """
-        corrected = str(text)
-        corrected = re.sub(r"([!?,;])\1+", r"\1", corrected)
-        corrected = re.sub(r"\.{2,}", r"...", corrected)
-        return corrected
 
-    text = text.strip().lower()
-    text = _replace_urls(text)
-    text = _simplify_punctuation(text)
-    return text.split(" ")
+def iter_batches(lines: Iterable[str], batch_size: int = 1024) -> Iterator[List[str]]:
+    """Groups an iterable of lines into lists of at most batch_size lines"""
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return
+        yield batch
 
-    # for token in tokens:
-    #     if "http" in token:
-    #         continue
-    #     norm.append(token)
-    return no_url
 
+def count_lines(lines: Iterable[str]) -> Tuple[Dict[str, int], Set[str]]:
+    """Counts characters, words and lines over an iterable of lines, and collects the set of
+    unique normalized words. The partial results of separate chunks of a file can be merged by
+    adding the counts and taking the union of the sets.
 
+    Args:
+        lines: Iterable of lines, e.g. an open text file
+
+    Returns:
+        Tuple of the counts dict and the set of unique words
+    """
+    counts = {
+        "char_count": 0,
+        "word_count": 0,
+        "line_count": 0,
+        "words_uniq": 0,
+    }
+    all_words = set()
+    for batch in iter_batches(lines):
+        for token_list in NORMALIZER.normalize_many(batch):
+            counts["char_count"] += count_chars(token_list)
+            counts["word_count"] += len(token_list)
+            counts["line_count"] += 1
+            all_words.update(token_list)
+    return counts, all_words
+
+
+@cache_file_result
 def word_count(file_path: str) -> Dict[str, int]:
     """Takes a filename as input measures the following:
     1. Number of characters (not including whitespace)
@@ -147,27 +538,148 @@ def word_count(file_path: str) -> Dict[str, int]:
         file_path (str): Path to text file
     """
     with open(file_path, "r") as f:
-        counts = {
-            "char_count": 0,
-            "word_count": 0,
-            "line_count": 0,
-            "words_uniq": 0,
-        }
-        all_words = set()
-        for line in f:
-            token_list = normalize(line)
-            counts["char_count"] += count_chars(token_list)
-            counts["word_count"] += len(token_list)
-            counts["line_count"] += 1
-            all_words.update(token_list)
+        counts, all_words = count_lines(f)
         counts["words_uniq"] = len(all_words)
         return counts
 
 
+def split_byte_ranges(file_path: str, parts: int) -> List[Tuple[int, int]]:
+    """Splits a file into at most `parts` contiguous (start, end) byte ranges of roughly equal
+    size. Every range except the last ends just after a newline, so no line is split between two
+    ranges.
+
+    Args:
+        file_path: Path to text file
+        parts: Number of ranges to aim for
+    """
+    size = os.path.getsize(file_path)
+    offsets = [0]
+    with open(file_path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, offsets[-1]))
+            f.readline()
+            offsets.append(f.tell())
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if end > start]
+
+
+def read_byte_range(file_path: str, start: int, end: int) -> io.TextIOWrapper:
+    """Reads the bytes between start and end and wraps them in a text stream that decodes and
+    translates newlines the same way open(file_path, "r") does."""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        return io.TextIOWrapper(io.BytesIO(f.read(end - start)))
+
+
+def imap_bounded(
+    pool: Executor,
+    func: Callable[..., Any],
+    arg_tuples: Iterable[Tuple[Any, ...]],
+    window: int,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """Runs func(*args) in a pool for each tuple of arg_tuples, with at most window tasks in
+    flight. Unlike pool.map, arg_tuples is only consumed as tasks are submitted and finished
+    results aren't held until the end, so memory is bounded by the window. Tasks not yet
+    started are cancelled if the caller stops iterating early.
+
+    Args:
+        pool: Thread or process pool
+        func: Function to run. Must be a module-level function for process pools
+        arg_tuples: Arguments of each call
+        window: Maximum number of tasks submitted but not yet yielded
+        ordered: Yield results in the order of arg_tuples. False yields them as they finish
+    """
+    pending = deque()
+    try:
+        for args in arg_tuples:
+            if len(pending) >= window:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, rest = wait(pending, return_when=FIRST_COMPLETED)
+                    pending = deque(rest)
+                    for future in done:
+                        yield future.result()
+            pending.append(pool.submit(func, *args))
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            for future in as_completed(pending):
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def map_byte_ranges(
+    file_path: str,
+    func: Callable[..., Any],
+    *args: Any,
+    workers: int,
+    chunk_size: int = 1 << 26,
+) -> Iterator[Any]:
+    """Splits a file into newline-aligned byte ranges of at most chunk_size bytes (and at least
+    one per worker), and yields func(file_path, start, end, *args) for each range, in file
+    order, from a pool of processes. At most two ranges per worker are in flight at once.
+
+    Args:
+        file_path: Path to text file
+        func: Module-level function of (file_path, start, end, *args)
+        args: Extra arguments passed to every call
+        workers: Number of worker processes
+        chunk_size: Upper bound on the bytes a worker holds in memory at once
+    """
+    parts = max(workers, os.path.getsize(file_path) // chunk_size + 1)
+    ranges = split_byte_ranges(file_path, parts)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from imap_bounded(
+            pool,
+            func,
+            ((file_path, start, end, *args) for start, end in ranges),
+            2 * workers,
+        )
+
+
+def count_byte_range(
+    file_path: str, start: int, end: int
+) -> Tuple[Dict[str, int], Set[str]]:
+    """Runs count_lines over one byte range of a file. Used as the worker of
+    word_count_parallel."""
+    return count_lines(read_byte_range(file_path, start, end))
+
+
+def word_count_parallel(
+    file_path: str, workers: Optional[int] = None, chunk_size: int = 1 << 26
+) -> Dict[str, int]:
+    """Same result as word_count, but the file is split into newline-aligned byte ranges that
+    are counted in a pool of processes. The partial counts are added up and the partial sets
+    of unique words are merged.
+
+    Args:
+        file_path: Path to text file
+        workers: Number of worker processes. Defaults to the number of CPUs
+        chunk_size: Upper bound on the bytes a worker holds in memory at once
+    """
+    workers = workers or os.cpu_count() or 1
+    counts = {"char_count": 0, "word_count": 0, "line_count": 0, "words_uniq": 0}
+    all_words = set()
+    for part_counts, part_words in map_byte_ranges(
+        file_path, count_byte_range, workers=workers, chunk_size=chunk_size
+    ):
+        for key, value in part_counts.items():
+            counts[key] += value
+        all_words.update(part_words)
+    counts["words_uniq"] = len(all_words)
+    return counts
+
+
 ################################################################################
 # Longest word per file/files
 
 
+@cache_file_result
 def find_longest_word(fp: str) -> str:
     """Takes a filename as an argument and returns the longest word found in the file
 
@@ -189,23 +701,73 @@ def find_longest_word(fp: str) -> str:
     #             longest = max_word
     #     return longest
 
-    # Attempt 2
+    # Attempt 2: Keeps a set of every word in the file, so memory grows with the vocabulary
+    # with open(fp, "r") as f:
+    #     words = set()
+    #     for line in f:
+    #         words.update(set(normalize(line)))
+    #     try:
+    #         return max(words, key=len)
+    #     except ValueError:
+    #         return ""
+
+    # Attempt 3: Only keeps the current longest word. Ties go to the first word seen.
+    longest = ""
     with open(fp, "r") as f:
-        words = set()
-        for line in f:
-            words.update(set(normalize(line)))
-        try:
-            return max(words, key=len)
-        except ValueError:
-            return ""
+        for batch in iter_batches(f):
+            for token_list in NORMALIZER.normalize_many(batch):
+                candidate = max(token_list, key=len)
+                if len(candidate) > len(longest):
+                    longest = candidate
+    return longest
+
 
+def find_longest_words(fp: str, top_k: int) -> List[str]:
+    """Takes a filename and returns the top_k longest distinct words in the file, longest first.
+    Words are streamed through a min-heap of at most top_k entries, so memory doesn't depend on
+    the size of the file. Ties in length are broken by reverse alphabetical order.
 
-def find_all_longest_words(fd: str) -> Dict[str, str]:
+    Args:
+        fp: File path
+        top_k: Number of words to return
+    """
+    if top_k <= 0:
+        return []
+    heap = []  # (length, word), shortest at heap[0]
+    in_heap = set()
+    with open(fp, "r") as f:
+        for batch in iter_batches(f):
+            for token_list in NORMALIZER.normalize_many(batch):
+                for word in token_list:
+                    if not word or word in in_heap:
+                        continue
+                    entry = (len(word), word)
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, entry)
+                        in_heap.add(word)
+                    elif entry > heap[0]:
+                        _, dropped = heapq.heapreplace(heap, entry)
+                        in_heap.discard(dropped)
+                        in_heap.add(word)
+    return [word for _, word in sorted(heap, reverse=True)]
+
+
+def find_all_longest_words(
+    fd: str,
+    workers: Optional[int] = 1,
+    executor: str = "thread",
+    manifest_path: Optional[str] = None,
+) -> Dict[str, str]:
     """Takes a directory name and returns a dict in which the keys are filenames and the values
-    are the longest words from each file.
+    are the longest words from each file. Entries that aren't regular files are skipped.
 
     Args:
         fd: File directory
+        workers: Number of workers. 1 runs in the calling thread, None uses the executor's
+            own default
+        executor: "thread" or "process"
+        manifest_path: Path to a DirectoryIndex manifest. When given, only files that are new
+            or changed since the last call with the same manifest are read
 
     Returns:
         Dict with filenames as keys, and longest words as value.
@@ -217,14 +779,213 @@ def find_all_longest_words(fd: str) -> Dict[str, str]:
     # for fp in file_paths:
     #     longest_words[fp] = find_longest_word(os.path.join(fd, fp))
 
-    # Attempt 2:
-    file_paths = pathlib.Path(fd)
-    longest_words = {
-        fp.name: find_longest_word(fp)
-        for fp in file_paths.iterdir()
-        if file_paths.is_dir()
-    }
-    return longest_words
+    # Attempt 2: One file at a time, and re-checks is_dir() on the directory for every entry
+    # file_paths = pathlib.Path(fd)
+    # longest_words = {
+    #     fp.name: find_longest_word(fp)
+    #     for fp in file_paths.iterdir()
+    #     if file_paths.is_dir()
+    # }
+    # return longest_words
+
+    # Attempt 3:
+    if manifest_path is not None:
+        return DirectoryIndex(manifest_path, find_longest_word).update(
+            fd, workers, executor
+        )
+    return dict(analyze_directory(fd, find_longest_word, workers, executor))
+
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+def iter_regular_files(fd: str) -> Iterator[os.DirEntry]:
+    """Yields the regular files in a directory (following symlinks). os.scandir caches the file
+    type from the directory listing, so on most platforms no extra stat call is needed."""
+    with os.scandir(fd) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry
+
+
+def analyze_directory(
+    fd: str,
+    func: Callable[[str], Any],
+    workers: Optional[int] = 1,
+    executor: str = "thread",
+) -> Iterator[Tuple[str, Any]]:
+    """Runs func on the path of every regular file in a directory, spread over a pool of
+    threads or processes. Yields (filename, result) tuples in the order the files finish.
+    func must be a module-level function when executor is "process".
+
+    Args:
+        fd: File directory
+        func: Function called with the path of each file
+        workers: Number of workers. 1 runs in the calling thread, None uses the executor's
+            own default
+        executor: "thread" or "process"
+    """
+    return analyze_entries(iter_regular_files(fd), func, workers, executor)
+
+
+def analyze_entries(
+    entries: Iterable[os.DirEntry],
+    func: Callable[[str], Any],
+    workers: Optional[int] = 1,
+    executor: str = "thread",
+) -> Iterator[Tuple[str, Any]]:
+    """Like analyze_directory, for a given set of directory entries. See analyze_directory for
+    the arguments."""
+    if executor not in EXECUTORS:
+        raise ValueError(f"executor must be one of {list(EXECUTORS)}, got {executor!r}")
+    if workers == 1:
+        return ((entry.name, func(entry.path)) for entry in entries)
+    return analyze_in_pool(entries, func, workers, executor)
+
+
+def analyze_file(name: str, path: str, func: Callable[[str], Any]) -> Tuple[str, Any]:
+    """Returns (name, func(path)). Used as the task of analyze_in_pool."""
+    return name, func(path)
+
+
+def analyze_in_pool(
+    entries: Iterable[os.DirEntry],
+    func: Callable[[str], Any],
+    workers: Optional[int],
+    executor: str,
+) -> Iterator[Tuple[str, Any]]:
+    """Runs func on each entry's path in a pool, with at most two files per worker in flight,
+    so a consumer that stops early doesn't wait for the rest of the directory"""
+    if workers is None:
+        # The executors' own defaults (as of Python 3.8)
+        cpus = os.cpu_count() or 1
+        workers = min(32, cpus + 4) if executor == "thread" else cpus
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        yield from imap_bounded(
+            pool,
+            analyze_file,
+            ((entry.name, entry.path, func) for entry in entries),
+            2 * workers,
+            ordered=False,
+        )
+
+
+################################################################################
+# Incremental directory index
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """BLAKE2b digest of a file's contents, read block_size bytes at a time"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DirectoryIndex:
+    """Keeps the results of a function over the regular files of a directory in a JSON
+    manifest, next to each file's size and mtime_ns (and, with hash_files, a digest of its
+    contents). update only runs the function on files that are new or whose fingerprint
+    changed, and drops deleted files from the manifest.
+
+    With hash_files, a changed or new file whose contents match a file already in the manifest
+    (e.g. after a rename, copy or touch) reuses that file's result instead of being
+    re-processed. Hashing reads every changed file once, so it pays off when func is more
+    expensive than reading.
+
+    Results are stored as JSON, so func should return str, numbers, lists or dicts.
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        func: Callable[[str], Any],
+        hash_files: bool = False,
+    ):
+        self.manifest_path = manifest_path
+        self.func = func
+        self.function = f"{func.__module__}.{func.__qualname__}"
+        self.hash_files = hash_files
+        self.entries = {}
+        self.processed = 0
+        self.removed = 0
+        self.load()
+
+    def load(self) -> None:
+        """Reads the manifest. A missing manifest, or one written for another function or
+        hashing mode, starts an empty index."""
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        if (
+            manifest.get("function") == self.function
+            and manifest.get("hash_files") == self.hash_files
+        ):
+            self.entries = manifest["entries"]
+
+    def save(self) -> None:
+        """Writes the manifest to a temporary file and renames it into place, so an
+        interrupted run leaves the previous manifest intact."""
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {
+                    "function": self.function,
+                    "hash_files": self.hash_files,
+                    "entries": self.entries,
+                },
+                f,
+            )
+        os.replace(temp_path, self.manifest_path)
+
+    def update(
+        self, fd: str, workers: Optional[int] = 1, executor: str = "thread"
+    ) -> Dict[str, Any]:
+        """Brings the index up to date with a directory, saves the manifest, and returns a
+        dict of filename to result. Sets processed and removed to the number of files func
+        was run on and the number of files dropped.
+
+        Args:
+            fd: File directory
+            workers: Number of workers for the changed files, as in analyze_directory
+            executor: "thread" or "process"
+        """
+        known_results = {
+            entry["hash"]: entry["result"]
+            for entry in self.entries.values()
+            if entry.get("hash") is not None
+        }
+        entries = {}
+        changed = []
+        for dir_entry in iter_regular_files(fd):
+            stat = dir_entry.stat()
+            entry = self.entries.get(dir_entry.name)
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                entries[dir_entry.name] = entry
+                continue
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if self.hash_files:
+                entry["hash"] = file_digest(dir_entry.path)
+                if entry["hash"] in known_results:
+                    entry["result"] = known_results[entry["hash"]]
+                    entries[dir_entry.name] = entry
+                    continue
+            entries[dir_entry.name] = entry
+            changed.append(dir_entry)
+        for name, result in analyze_entries(changed, self.func, workers, executor):
+            entries[name]["result"] = result
+        self.processed = len(changed)
+        self.removed = len(self.entries.keys() - entries.keys())
+        self.entries = entries
+        self.save()
+        return {name: entry["result"] for name, entry in entries.items()}
 
 
 ################################################################################
@@ -251,26 +1012,97 @@ def read_passwd(read_path: str) -> List[List[str]]:
     # return rows
 
     # Attempt 2:
-    rows = []
-    with open(read_path, "r") as f:
-        reader = csv.reader(f, delimiter=":")
-        for line in reader:
-            if len(line) <= 1:
-                continue
-            rows.append([line[0], line[2]])
-    return rows
+    # rows = []
+    # with open(read_path, "r") as f:
+    #     reader = csv.reader(f, delimiter=":")
+    #     for line in reader:
+    #         if len(line) <= 1:
+    #             continue
+    #         rows.append([line[0], line[2]])
+    # return rows
+
+    # Attempt 3:
+    return [
+        [fields[0], fields[2]]
+        for fields in load_passwd(read_path).records
+        if len(fields) > 2
+    ]
 
 
-def write_passwd(user_list: List[List[str]], write_path: str) -> None:
+def write_passwd(
+    user_list: Iterable[Sequence[str]],
+    write_path: str,
+    batch_size: int = 10000,
+    buffer_size: int = 1 << 20,
+) -> None:
     """Takes a list of lists and writes them to a TSV file
 
     Args:
+        user_list: Rows to write
         write_path: Path to output TSV file
+        batch_size: Number of rows formatted and written per call
+        buffer_size: Size in bytes of the output buffer
     """
-    with open(write_path, "w") as f:
+    # Attempt 1: One writerow call per row
+    # with open(write_path, "w") as f:
+    #     writer = csv.writer(f, delimiter="\t")
+    #     for user in user_list:
+    #         writer.writerow(user)
+
+    # Attempt 2:
+    write_tsv(user_list, write_path, batch_size, buffer_size)
+
+
+def format_tsv_batch(rows: List[Sequence[str]]) -> Optional[str]:
+    """Formats rows of strings as TSV text, byte for byte what csv.writer(delimiter="\\t")
+    would write, as long as no field needs quoting. Returns None when some field does (it holds
+    a tab, a quote or a line break, is the only and empty field of its row, or isn't a str).
+    """
+    try:
+        lines = ["\t".join(row) for row in rows]
+    except TypeError:
+        return None
+    text = "\r\n".join(lines)
+    tabs = 0
+    for row in rows:
+        if len(row) == 1 and not row[0]:
+            return None
+        tabs += len(row) - 1
+    separators = len(lines) - 1
+    if (
+        '"' in text
+        or text.count("\t") != tabs
+        or text.count("\r") != separators
+        or text.count("\n") != separators
+    ):
+        return None
+    return text + "\r\n" if lines else ""
+
+
+def write_tsv(
+    rows: Iterable[Sequence[str]],
+    write_path: str,
+    batch_size: int = 10000,
+    buffer_size: int = 1 << 20,
+) -> None:
+    """Writes rows to a TSV file in batches. Each batch is written with a single write() of
+    pre-joined text when none of its fields needs quoting, and with csv.writer.writerows
+    otherwise, so the output is the same as writing every row with csv.writer.
+
+    Args:
+        rows: Rows to write
+        write_path: Path to output TSV file
+        batch_size: Number of rows formatted and written per call
+        buffer_size: Size in bytes of the output buffer
+    """
+    with open(write_path, "w", buffering=buffer_size) as f:
         writer = csv.writer(f, delimiter="\t")
-        for user in user_list:
-            writer.writerow(user)
+        for batch in iter_batches(rows, batch_size):
+            text = format_tsv_batch(batch)
+            if text is None:
+                writer.writerows(batch)
+            else:
+                f.write(text)
 
 
 def passwd_to_tsv(read_path: str, write_path: str) -> None:
@@ -286,60 +1118,146 @@ def passwd_to_tsv(read_path: str, write_path: str) -> None:
     # write_passwd(rows, write_path)
 
     # Attempt 2:
-    with open(read_path, "r") as rf, open(write_path, "w") as wf:
-        reader = csv.reader(rf, delimiter=":")
-        writer = csv.writer(wf, delimiter="\t")
-        for line in reader:
-            if len(line) > 1:
-                writer.writerow([line[0], line[2]])
+    # with open(read_path, "r") as rf, open(write_path, "w") as wf:
+    #     reader = csv.reader(rf, delimiter=":")
+    #     writer = csv.writer(wf, delimiter="\t")
+    #     for line in reader:
+    #         if len(line) > 1:
+    #             writer.writerow([line[0], line[2]])
+
+    # Attempt 3:
+    write_passwd(read_passwd(read_path), write_path)
 
 
 ################################################################################
 # JSON
 
 
-def analyze_scores(read_path: str, write_path: str) -> None:
+def analyze_scores(
+    read_path: str,
+    write_path: str,
+    workers: Optional[int] = 1,
+    executor: str = "process",
+) -> None:
     """Reads a directory with multiple JSON files of test scores.  Calculates the highest, lowest,
-    and average test scores for each subject in each class, and writes them to a TSV file"""
-    file_paths = pathlib.Path(read_path).iterdir()
+    and average test scores for each subject in each class, and writes them to a TSV file.
+
+    Each file is reduced to running min/max/sum/count accumulators per subject (see
+    score_stats), optionally in a pool of workers, and the TSV is written once at the end with
+    the classes in sorted order.
+
+    Args:
+        read_path: Directory of JSON files, one per class (named after the class)
+        write_path: Path to output TSV file
+        workers: Number of workers. 1 runs in the calling process
+        executor: "thread" or "process"
+    """
+    # Attempt 1: Rewrites the TSV, with every class seen so far, once per input file, and keeps
+    # every score in memory
+    # file_paths = pathlib.Path(read_path).iterdir()
+    # classes_results = {}
+    # for path in file_paths:
+    #     with open(path, "r") as rf, open(write_path, "w") as wf:
+    #         # Read JSON
+    #         classes_results[path.stem] = defaultdict(list)
+    #         _scores = json.load(rf)
+    #         for _score in _scores:
+    #             for subject, subject_score in _score.items():
+    #                 # Setting defaultdict above is equivalent to below:
+    #                 # classes_results[path.stem].setdefault(subject, [])
+    #                 classes_results[path.stem][subject].append(subject_score)
+    #         # Write to TSV
+    #         writer = csv.writer(wf, delimiter="\t")
+    #         header = ["class", "subject", "min_score", "max_score", "avg_score"]
+    #         writer.writerow(header)
+    #         for _class in classes_results:
+    #             for _subject, _scores in classes_results[_class].items():
+    #                 _min, _max, _avg = (
+    #                     min(_scores),
+    #                     max(_scores),
+    #                     sum(_scores) / len(_scores),
+    #                 )
+    #                 writer.writerow([_class, _subject, _min, _max, _avg])
+
+    # Attempt 2:
     classes_results = {}
-    for path in file_paths:
-        with open(path, "r") as rf, open(write_path, "w") as wf:
-            # Read JSON
-            classes_results[path.stem] = defaultdict(list)
-            _scores = json.load(rf)
-            for _score in _scores:
-                for subject, subject_score in _score.items():
-                    # Setting defaultdict above is equivalent to below:
-                    # classes_results[path.stem].setdefault(subject, [])
-                    classes_results[path.stem][subject].append(subject_score)
-            # Write to TSV
-            writer = csv.writer(wf, delimiter="\t")
-            header = ["class", "subject", "min_score", "max_score", "avg_score"]
-            writer.writerow(header)
-            for _class in classes_results:
-                for _subject, _scores in classes_results[_class].items():
-                    _min, _max, _avg = (
-                        min(_scores),
-                        max(_scores),
-                        sum(_scores) / len(_scores),
-                    )
-                    writer.writerow([_class, _subject, _min, _max, _avg])
+    for _, (_class, stats) in analyze_directory(
+        read_path, score_stats, workers, executor
+    ):
+        merged = classes_results.setdefault(_class, {})
+        for subject, accumulator in stats.items():
+            if subject in merged:
+                merged[subject] = merge_score_stats(merged[subject], accumulator)
+            else:
+                merged[subject] = accumulator
+    rows = [["class", "subject", "min_score", "max_score", "avg_score"]]
+    for _class in sorted(classes_results):
+        for subject, (_min, _max, total, count) in classes_results[_class].items():
+            rows.append([_class, subject, _min, _max, total / count])
+    write_tsv(rows, write_path)
+
+
+@cache_file_result
+def score_stats(file_path: str) -> Tuple[str, Dict[str, List[float]]]:
+    """Reads one JSON file of test scores (a list of {subject: score} dicts) and returns the
+    class name (the file's stem) with a [min, max, sum, count] accumulator per subject.
+
+    Args:
+        file_path: Path to JSON file
+    """
+    stats = {}
+    with open(file_path, "r") as f:
+        for _score in json.load(f):
+            for subject, subject_score in _score.items():
+                accumulator = stats.get(subject)
+                if accumulator is None:
+                    stats[subject] = [subject_score, subject_score, subject_score, 1]
+                    continue
+                if subject_score < accumulator[0]:
+                    accumulator[0] = subject_score
+                if subject_score > accumulator[1]:
+                    accumulator[1] = subject_score
+                accumulator[2] += subject_score
+                accumulator[3] += 1
+    return pathlib.Path(file_path).stem, stats
+
+
+def merge_score_stats(a: List[float], b: List[float]) -> List[float]:
+    """Merges two [min, max, sum, count] accumulators"""
+    return [min(a[0], b[0]), max(a[1], b[1]), a[2] + b[2], a[3] + b[3]]
 
 
 ################################################################################
 # Reverse Lines
 
 
-def reverse_lines(read_path: str, write_path: str) -> None:
+def reverse_lines(
+    read_path: str, write_path: str, binary: bool = False, chunk_size: int = 1 << 20
+) -> None:
     """Reads a text file and writes to another path with the strings reversed.
 
+    Lines are read roughly chunk_size bytes at a time, and each chunk is reversed and written
+    with a single write() call.
+
     Args:
         read_path: Path to text file to read
         write_path: Path to text file to write
+        binary: Reverse raw bytes, skipping decoding and encoding. Only correct for ASCII (or
+            other single-byte encoded) files
+        chunk_size: Approximate number of bytes read per chunk
     """
-    with open(read_path, "r") as rf, open(write_path, "w") as wf:
-        for line in rf:
-            line = line.rstrip()
-            reverse = f"{line[::-1]}\n"
-            wf.write(reverse)
+    # Attempt 1: One rstrip, slice, f-string and write() per line
+    # with open(read_path, "r") as rf, open(write_path, "w") as wf:
+    #     for line in rf:
+    #         line = line.rstrip()
+    #         reverse = f"{line[::-1]}\n"
+    #         wf.write(reverse)
+
+    # Attempt 2:
+    mode, newline = ("b", b"\n") if binary else ("", "\n")
+    with open(read_path, "r" + mode) as rf, open(write_path, "w" + mode) as wf:
+        while True:
+            lines = rf.readlines(chunk_size)
+            if not lines:
+                break
+            wf.write(newline.join([line.rstrip()[::-1] for line in lines]) + newline)
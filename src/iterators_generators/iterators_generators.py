@@ -345,9 +345,13 @@ function.
 
 
 def file_usage_timing(path: str) -> Generator:
-    for file in os.listdir(path):
-        info = os.stat(os.path.join(path, file))
-        yield file, info.st_atime, info.st_mtime, info.st_ctime
+    # for file in os.listdir(path):
+    #     info = os.stat(os.path.join(path, file))
+    #     yield file, info.st_atime, info.st_mtime, info.st_ctime
+    with os.scandir(path) as entries:
+        for entry in entries:
+            info = entry.stat()
+            yield entry.name, info.st_atime, info.st_mtime, info.st_ctime
 
 
 """
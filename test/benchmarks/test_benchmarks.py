@@ -0,0 +1,60 @@
+import inspect
+import json
+
+import pytest
+
+from benchmarks.inputs import INPUTS, generate_inputs, input_size
+from benchmarks.run import *
+from src.files import files
+
+
+@pytest.fixture(scope="module")
+def inputs(tmp_path_factory):
+    return generate_inputs(str(tmp_path_factory.mktemp("inputs")), 1 << 14)
+
+
+def test_every_public_function_is_benchmarked():
+    covered = {name for bench in BENCHMARKS.values() for name in bench.covers}
+    public = {
+        name
+        for name, obj in vars(files).items()
+        if not name.startswith("_")
+        and (inspect.isfunction(obj) or inspect.isclass(obj))
+        and obj.__module__ == files.__name__
+    }
+    assert public - covered == set()
+    assert covered - public <= set(BENCHMARKS)
+
+
+def test_generate_inputs(inputs):
+    assert set(inputs) == set(INPUTS)
+    for path in inputs.values():
+        assert input_size(path) >= 1 << 13
+
+
+def test_generate_inputs_reuses_same_size(tmp_path):
+    paths = generate_inputs(str(tmp_path), 1 << 12)
+    mtime = (tmp_path / "tsv").stat().st_mtime_ns
+    assert generate_inputs(str(tmp_path), 1 << 12) == paths
+    assert (tmp_path / "tsv").stat().st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize("name", list(BENCHMARKS))
+def test_run_benchmark(inputs, name):
+    result = run_benchmark(name, inputs[BENCHMARKS[name].input], repeat=1)
+    assert result["name"] == name
+    assert result["best_s"] >= 0
+    assert result["input_bytes"] > 0
+    json.dumps(result)
+
+
+def test_compare():
+    baseline = {"results": [{"name": "a", "best_s": 1.0}, {"name": "b", "best_s": 1.0}]}
+    current = {
+        "results": [
+            {"name": "a", "best_s": 1.05},
+            {"name": "b", "best_s": 1.5},
+            {"name": "c", "best_s": 9.0},
+        ]
+    }
+    assert compare(baseline, current, threshold=0.1) == ["b"]
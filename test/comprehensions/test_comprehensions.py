@@ -1,3 +1,5 @@
+import random
+from concurrent.futures import Future
 from unittest import mock
 
 from io import StringIO
@@ -38,6 +40,30 @@ def test_reverse_lines_in_file(text_file):
     ]
 
 
+def test_iter_reversed_lines(text_file):
+    assert list(iter_reversed_lines(text_file)) == reverse_lines_in_file(text_file)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 12, 1 << 20])
+def test_iter_reversed_chunks(tmp_path, chunk_size):
+    f = tmp_path / "text_file.txt"
+    f.write_text("foo bar\n  baz \n\nqux\r\nlast")
+    lines = [line for chunk in iter_reversed_chunks(f, chunk_size) for line in chunk]
+    assert lines == ["rab oof", "zab", "", "xuq", "tsal"]
+
+
+def test_iter_reversed_chunks_trailing_newline(tmp_path):
+    f = tmp_path / "text_file.txt"
+    f.write_text("ab\ncd\n")
+    assert list(iter_reversed_chunks(f, 2)) == [["ba"], ["dc"]]
+
+
+def test_write_reversed_lines(tmp_path, text_file):
+    out = tmp_path / "out.txt"
+    write_reversed_lines(text_file, out, chunk_size=4)
+    assert out.read_text() == "zab rab oof\noof rab zab\noof oof oof\n"
+
+
 ################################################################################
 # Sum Numbers
 
@@ -56,6 +82,42 @@ def test_sum_numbers(inputs, expected):
     assert sum_numbers(inputs) == expected
 
 
+@pytest.mark.parametrize(
+    "inputs, expected",
+    [
+        (b"", 0),
+        (b"10 20 a 30 bcd 40", 100),
+        (b"3 *** 9 @foo 10", 22),
+        (b"12, 1.5 x9 9x -4 +4\n7\t8\r\n", 15),
+    ],
+)
+def test_sum_numbers_in_buffer(inputs, expected):
+    assert sum_numbers_in_buffer(inputs) == expected
+    assert sum_numbers_in_buffer(inputs, chunk_size=1) == expected
+
+
+def test_token_aligned_ranges():
+    buffer = b"123 4567\n89 0"
+    ranges = token_aligned_ranges(buffer, 2)
+    assert ranges == [(0, 4), (4, 9), (9, 12), (12, 13)]
+    assert token_aligned_ranges(buffer, 2, start=4, end=9) == [(4, 9)]
+    assert token_aligned_ranges(b"", 2) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sum_numbers_in_file(tmp_path, workers):
+    text = " ".join(["12", "x", "345", "6a", "7"] * 1000) + "\n" + "1" * 30
+    f = tmp_path / "numbers.txt"
+    f.write_text(text)
+    assert sum_numbers_in_file(f, workers=workers, chunk_size=100) == sum_numbers(text)
+
+
+def test_sum_numbers_in_file_empty(tmp_path):
+    f = tmp_path / "empty.txt"
+    f.write_text("")
+    assert sum_numbers_in_file(f) == 0
+
+
 @pytest.fixture
 def book_sample(tmp_path):
     f = tmp_path / "text_file.txt"
@@ -74,6 +136,58 @@ def test_filter_to_lexically_diverse(book_sample):
     ]
 
 
+def test_filter_to_lexically_diverse_threshold(book_sample):
+    assert len(filter_to_lexically_diverse(book_sample, threshold=4)) == 3
+    assert len(filter_to_lexically_diverse(book_sample, threshold=5)) == 2
+    assert filter_to_lexically_diverse(book_sample, threshold=100) == []
+
+
+@pytest.mark.parametrize(
+    "line, threshold, expected",
+    [
+        ("a b c", 2, True),
+        ("a b c", 3, False),
+        ("a a a a a a b", 1, True),
+        ("a a a a a a a", 1, False),
+        ("a b a b a b c", 2, True),
+        ("", 0, False),
+    ],
+)
+def test_is_lexically_diverse(line, threshold, expected):
+    assert is_lexically_diverse(line, threshold) == expected
+    assert is_lexically_diverse(line, threshold) == (
+        lexical_diversity(line) > threshold
+    )
+
+
+def test_iter_lexically_diverse_scores():
+    lines = ["a b c\n", "a a b\n", "a b c d\n"]
+    assert list(iter_lexically_diverse(lines, 2)) == ["a b c", "a b c d"]
+    assert list(iter_lexically_diverse(lines, 2, scores=True)) == [
+        ("a b c", 3),
+        ("a b c d", 4),
+    ]
+
+
+@pytest.mark.parametrize("scores", [False, True])
+def test_filter_to_lexically_diverse_parallel(tmp_path, scores):
+    f = tmp_path / "lines.txt"
+    f.write_text(
+        "".join(" ".join(str(j) for j in range(i % 30)) + "\n" for i in range(300))
+    )
+    with open(f) as fp:
+        expected = list(iter_lexically_diverse(fp, 20, scores))
+    assert expected
+    assert (
+        list(
+            filter_to_lexically_diverse_parallel(
+                f, scores=scores, workers=2, chunk_size=500
+            )
+        )
+        == expected
+    )
+
+
 @pytest.mark.parametrize(
     "inputs, expected",
     [
@@ -86,6 +200,57 @@ def test_change_area_code(inputs, expected):
     assert change_area_code(inputs) == expected
 
 
+def test_change_area_codes_many_matches_change_area_code():
+    tel_nums = [f"{a:03d}-{b}00-1234" for a in (0, 9, 123, 999) for b in range(10)]
+    assert list(change_area_codes_many(tel_nums, batch_size=7)) == [
+        change_area_code(tel_num) for tel_num in tel_nums
+    ]
+
+
+def test_change_area_codes_many_table():
+    tel_nums = ["212-555-1234", "212-999-0000", "313-111-2222"]
+    assert list(change_area_codes_many(tel_nums, {"212": "646"})) == [
+        "646-555-1234",
+        "646-999-0000",
+        "313-111-2222",
+    ]
+
+
+def test_change_area_codes():
+    text = (
+        "a,123-456-7890,123-777-8888\n"
+        "b,tel:009-000-0000,1123-456-7890,123-456-78901\n"
+    )
+    assert change_area_codes(text) == (
+        "a,124-456-7890,123-777-8888\nb,tel:10-000-0000,1123-456-7890,123-456-78901\n"
+    )
+    assert change_area_codes(text, {"123": "321"}) == (
+        "a,321-456-7890,321-777-8888\nb,tel:009-000-0000,1123-456-7890,123-456-78901\n"
+    )
+
+
+def test_change_area_codes_in_file(tmp_path):
+    read_path = tmp_path / "in.csv"
+    read_path.write_text("".join(f"{i},123-{i % 10}00-0000\n" for i in range(100)))
+    write_path = tmp_path / "out.csv"
+    change_area_codes_in_file(read_path, write_path, chunk_size=50)
+    assert write_path.read_text() == "".join(
+        f"{i},{change_area_code(f'123-{i % 10}00-0000')}\n" for i in range(100)
+    )
+
+
+def test_change_area_codes_in_column(tmp_path):
+    read_path = tmp_path / "in.csv"
+    read_path.write_bytes(
+        b"name,phone\r\nann,123-456-7890\r\nbob,123-777-8888\r\nshort\r\n"
+    )
+    write_path = tmp_path / "out.csv"
+    change_area_codes_in_column(read_path, write_path, 1, header=True, batch_size=2)
+    assert write_path.read_bytes() == (
+        b"name,phone\r\nann,124-456-7890\r\nbob,123-777-8888\r\nshort\r\n"
+    )
+
+
 ################################################################################
 # Flatten
 
@@ -115,6 +280,58 @@ def test_flatten_odd_ints(inputs, expected):
     assert flatten_odd_ints(inputs) == expected
 
 
+def test_flatten_odd_ints_excluded_types():
+    assert flatten_odd_ints([[-3, 3.0, True, "5", "-7", None, 9]]) == [5, 9]
+
+
+@pytest.mark.parametrize(
+    "inputs, expected",
+    [
+        ([], []),
+        ([[], [[]]], []),
+        ([1, [2, [3, [4]]], (5,)], [1, 2, 3, 4, 5]),
+        (["ab", [b"cd", [bytearray(b"e")]]], ["ab", b"cd", bytearray(b"e")]),
+        ([range(3), iter([3, {4}])], [0, 1, 2, 3, 4]),
+        ([None, 1.5, [object]], [None, 1.5, object]),
+    ],
+)
+def test_flatten_deep(inputs, expected):
+    assert flatten_deep(inputs) == expected
+
+
+def test_iter_flatten_very_deep():
+    nested = [0]
+    for i in range(1, 10000):
+        nested = [nested, i]
+    assert list(iter_flatten(nested)) == list(range(10000))
+
+
+def test_iter_flatten_is_lazy():
+    def endless():
+        i = 0
+        while True:
+            yield [i, [i + 1]]
+            i += 2
+
+    flat = iter_flatten(endless())
+    assert [next(flat) for _ in range(5)] == [0, 1, 2, 3, 4]
+
+
+def test_iter_flatten_steps():
+    nested = [[1, "3", [4, "x", [-5, "7"]]], 9.0]
+    steps = (to_non_negative_int, keep_if(lambda n: n & 1))
+    assert flatten_deep(nested, steps) == [1, 3, 7]
+    assert flatten_deep(nested, [str]) == ["1", "3", "4", "x", "-5", "7", "9.0"]
+
+
+def test_flatten_to_array():
+    result = flatten_to_array([[1, 2], [], [3, -(2**62)]])
+    assert result.typecode == "q"
+    assert result.tolist() == [1, 2, 3, -(2**62)]
+    with pytest.raises(OverflowError):
+        flatten_to_array([[2**63]])
+
+
 def test_get_children():
     tree = {
         "foo": ["foo", "far", "faz"],
@@ -165,6 +382,66 @@ def test_sort_children_by_oldest():
     ]
 
 
+@pytest.fixture
+def family_tree():
+    return {
+        "foo": [{"name": "foo", "age": 12}, {"name": "far", "age": 14}],
+        "bar": [{"name": "boo", "age": 22}, {"name": "baz", "age": 14}],
+        "zab": [{"name": "zoo", "age": 2}],
+    }
+
+
+def test_family_tree_matches_functions(family_tree):
+    tree = FamilyTree(family_tree)
+    assert len(tree) == 5
+    assert tree.eldest() == sort_children_by_oldest(family_tree)
+    assert tree.eldest(2) == ["boo", "far"]
+    assert tree.eldest(0) == []
+    assert tree.grandchildren() == ["foo", "far", "boo", "baz", "zoo"]
+    assert tree.to_dict() == family_tree
+
+
+def test_family_tree_add_and_remove(family_tree):
+    tree = FamilyTree(family_tree)
+    tree.add("new", "eldest", 90)
+    tree.add("zab", "zaz", 14)
+    assert tree.eldest(5) == ["eldest", "boo", "far", "baz", "zaz"]
+    tree.remove("foo", "far")
+    tree.remove("new", "eldest")
+    assert tree.eldest() == ["boo", "baz", "zaz", "foo", "zoo"]
+    assert tree.grandchildren() == ["foo", "boo", "baz", "zoo", "zaz"]
+    with pytest.raises(KeyError):
+        tree.remove("foo", "far")
+    tree.remove_child("bar")
+    assert tree.eldest() == ["zaz", "foo", "zoo"]
+    assert tree.eldest() == sort_children_by_oldest(tree.to_dict())
+
+
+def test_family_tree_ties_in_insertion_order():
+    tree = FamilyTree(
+        {"a": [{"name": "a1", "age": 5}], "b": [{"name": "b1", "age": 3}]}
+    )
+    tree.add("a", "a2", 3)
+    tree.add("b", "b2", 5)
+    assert tree.eldest() == ["a1", "b2", "b1", "a2"]
+    assert sort_children_by_oldest(tree.to_dict()) == ["a1", "b2", "a2", "b1"]
+    tree.remove("a", "a1")
+    tree.add("a", "a1", 5)
+    assert tree.eldest(2) == ["b2", "a1"]
+
+
+def test_family_tree_remove_child_few_grandchildren():
+    tree = FamilyTree()
+    for i in range(100):
+        tree.add(f"child{i % 50}", f"grandchild{i}", i % 7)
+    tree.remove_child("child3")
+    remaining = [i for i in range(100) if i % 50 != 3]
+    assert tree.eldest() == [
+        f"grandchild{i}" for i in sorted(remaining, key=lambda i: -(i % 7))
+    ]
+    assert len(tree) == 98
+
+
 @pytest.fixture
 def simple_file(tmp_path):
     f = tmp_path / "filename.txt"
@@ -189,6 +466,133 @@ def test_funcfile(simple_file):
     )
 
 
+@pytest.fixture
+def repetitive_file(tmp_path):
+    f = tmp_path / "repetitive.txt"
+    f.write_text("".join(f"the cat and the dog number {i % 7}\n" for i in range(200)))
+    return f
+
+
+@pytest.mark.parametrize("memoize", [True, False])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_funcfile(repetitive_file, memoize, workers):
+    with open(repetitive_file) as f:
+        expected = " ".join(
+            to_pig_latin(word) for line in f for word in line.rstrip().split(" ")
+        )
+    pieces = list(
+        iter_funcfile(repetitive_file, to_pig_latin, memoize, workers, chunk_size=1000)
+    )
+    assert len(pieces) > 1
+    assert "".join(pieces) == expected
+
+
+def test_iter_funcfile_empty_file(tmp_path):
+    f = tmp_path / "empty.txt"
+    f.write_text("")
+    assert funcfile(f, to_pig_latin) == ""
+    assert "".join(iter_funcfile(f, to_pig_latin, workers=2)) == ""
+
+
+def test_write_funcfile(tmp_path, repetitive_file):
+    out = tmp_path / "out.txt"
+    write_funcfile(repetitive_file, out, to_pig_latin)
+    assert out.read_text() == plfile(repetitive_file)
+
+
+def test_cached_word_function():
+    calls = []
+
+    def upper(word):
+        calls.append(word)
+        return word.upper()
+
+    cached = cached_word_function(upper, maxsize=2, shared=False)
+    assert [cached(word) for word in ["a", "b", "a", "a", "c", "b"]] == list("ABAACB")
+    assert calls == ["a", "b", "c", "b"]
+    assert cache_hit_rate(cached) == 2 / 6
+    shared = cached_word_function(to_pig_latin, shared=True)
+    assert cached_word_function(to_pig_latin, shared=True) is shared
+    assert cached_word_function(to_pig_latin) is not shared
+    assert cached_word_function(upper, shared=True) is not cached_word_function(upper)
+
+
+def test_word_caches_bounded(simple_file):
+    WORD_CACHES.clear()
+    for _ in range(3):
+        funcfile(simple_file, lambda word: word.upper(), shared=True)
+    assert len(WORD_CACHES) == 0
+    for maxsize in range(MAX_WORD_CACHES + 5):
+        cached_word_function(to_pig_latin, maxsize=maxsize, shared=True)
+    assert len(WORD_CACHES) == MAX_WORD_CACHES
+    assert (to_pig_latin, MAX_WORD_CACHES + 4) in WORD_CACHES
+    assert (to_pig_latin, 0) not in WORD_CACHES
+
+
+def test_funcfile_memoize_hit_rate(repetitive_file):
+    WORD_CACHES.clear()
+    funcfile(repetitive_file, cap_every_odd_letter, shared=True)
+    cached = cached_word_function(cap_every_odd_letter, shared=True)
+    assert cached.cache_info().misses == 12
+    assert cache_hit_rate(cached) == 1 - 12 / 1400
+    funcfile(repetitive_file, to_pig_latin)
+    assert len(WORD_CACHES) == 1
+
+
+class Suffixer:
+    def __init__(self, suffix):
+        self.suffix = suffix
+
+    def add_suffix(self, word):
+        return word + self.suffix
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_funcfile_bound_method_sees_owner_changes(tmp_path, shared):
+    f = tmp_path / "words.txt"
+    f.write_text("a b a\n")
+    suffixer = Suffixer("1")
+    assert funcfile(f, suffixer.add_suffix, shared=shared) == "a1 b1 a1"
+    suffixer.suffix = "2"
+    assert funcfile(f, suffixer.add_suffix, shared=shared) == "a2 b2 a2"
+    assert not is_module_level(suffixer.add_suffix)
+    assert is_module_level(to_pig_latin) and is_module_level(len)
+
+
+def reference_cap_every_odd_letter(string):
+    return "".join(
+        letter.upper() if (i + 1) % 2 == 1 else letter.lower()
+        for i, letter in enumerate(string)
+    )
+
+
+@pytest.mark.parametrize(
+    "strings",
+    [
+        [],
+        [""],
+        ["a", "", "abc", "abcd", "Hello World", "", "x"],
+        ["straße", "abc", "Ünïcode"],
+        ["a\0\0b", "c"],
+        ["a\x01", "bc"],
+    ],
+)
+def test_cap_every_odd_letter_many(strings):
+    expected = [reference_cap_every_odd_letter(s) for s in strings]
+    assert [cap_every_odd_letter(s) for s in strings] == expected
+    assert cap_every_odd_letter_many(strings) == expected
+    assert cap_every_odd_letter_many(iter(strings)) == expected
+
+
+def test_to_pig_latin_many():
+    words = ["apple", "banana", "apple", "cherry", "egg"]
+    table = {}
+    assert to_pig_latin_many(words, table) == [to_pig_latin(w) for w in words]
+    assert len(table) == 4
+    assert to_pig_latin_many(["banana"], {"banana": "cached"}) == ["cached"]
+    assert to_pig_latin_many([]) == []
+
+
 def test_dict_to_list_of_tuples():
     list_dicts = [
         {"foo": 1, "bar": 2, "baz": 3},
@@ -214,7 +618,105 @@ def test_get_most_common_scores():
         {"bar": [83, 22, 78], "baz": [83, 64, 55], "zab": [11, 22, 33]},
         {"baz": [88, 98, 78], "buz": [99, 99, 99], "zooz": [83, 99, 34]},
     ]
-    assert get_most_common_score(list_dicts) == [(99, 5), (88, 3), (64, 3)]
+    assert get_most_common_score(list_dicts, field=None) == [(99, 5), (88, 3), (64, 3)]
+    assert get_most_common_score(list_dicts, k=1, field=None) == [(99, 5)]
+
+
+def test_get_most_common_score_values_only():
+    records = [
+        {"name": "foo", "values": [85, 88, 99]},
+        {"name": "bar", "values": [88, 99, 99]},
+        {"name": "baz", "values": []},
+    ]
+    assert get_most_common_score(iter(records), k=2) == [(99, 3), (88, 2)]
+
+
+def test_score_counter_approximate():
+    rng = random.Random(0)
+    scores = [
+        rng.choice([90] * 50 + [80] * 20 + list(range(200))) for _ in range(20000)
+    ]
+    exact = Counter(scores)
+    counter = ScoreCounter(k=2, capacity=10)
+    for i in range(0, len(scores), 7):
+        counter.update(scores[i : i + 7])
+    assert len(counter) <= 20
+    assert [score for score, _ in counter.most_common()] == [90, 80]
+    for score, count in counter.most_common(10):
+        assert exact[score] - len(scores) / 11 <= count <= exact[score]
+
+
+@pytest.mark.parametrize("capacity", [None, 5])
+def test_score_counter_merge(capacity):
+    records = [{"name": str(i), "values": [i % 7, i % 3, 1]} for i in range(300)]
+    whole = ScoreCounter(capacity=capacity)
+    for record in records:
+        whole.add(record)
+    left, right = ScoreCounter(capacity=capacity), ScoreCounter(capacity=capacity)
+    for record in records[:100]:
+        left.add(record)
+    for record in records[100:]:
+        right.add(record)
+    merged = left.merge(right)
+    assert merged.total == whole.total == 900
+    assert merged.most_common(1) == whole.most_common(1)
+    if capacity is None:
+        assert merged.most_common() == whole.most_common()
+
+
+def test_score_counter_invalid():
+    with pytest.raises(ValueError):
+        ScoreCounter(k=0)
+    with pytest.raises(ValueError):
+        ScoreCounter(k=3, capacity=2)
+
+
+def test_get_most_common_score_parallel():
+    records = [{"name": str(i), "values": [i % 7, i % 3]} for i in range(1000)]
+    expected = get_most_common_score(records)
+    # Scores 1 and 2 tie, so their order depends on which batches finish first
+    result = get_most_common_score_parallel(records, workers=2, batch_size=30)
+    assert sorted(result) == sorted(expected)
+
+
+class CountingExecutor:
+    """Runs tasks on submit, and tracks how many results are waiting to be collected"""
+
+    def __init__(self, workers):
+        self.outstanding = 0
+        self.peak = 0
+        CountingExecutor.last = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def submit(self, func, *args):
+        executor = self
+
+        class CountedFuture(Future):
+            def result(self, timeout=None):
+                executor.outstanding -= 1
+                return super().result(timeout)
+
+        future = CountedFuture()
+        future.set_result(func(*args))
+        self.outstanding += 1
+        self.peak = max(self.peak, self.outstanding)
+        return future
+
+
+def test_get_most_common_score_parallel_bounds_batches_in_flight():
+    records = ({"name": str(i), "values": [0, i % 7]} for i in range(1000))
+    with mock.patch(
+        "src.comprehensions.comprehensions.ProcessPoolExecutor", CountingExecutor
+    ):
+        result = get_most_common_score_parallel(records, k=1, workers=2, batch_size=10)
+    assert result == [(0, 1143)]
+    assert CountingExecutor.last.peak <= 4
+    assert CountingExecutor.last.outstanding == 0
 
 
 ################################################################################
@@ -234,6 +736,37 @@ def test_flipped_dict(input, expected):
     assert flip_dict(input) == expected
 
 
+def test_bidict():
+    bidict = BiDict({"a": 1, "b": 2})
+    assert bidict == {"a": 1, "b": 2}
+    assert bidict.inverse == flip_dict(bidict)
+    assert bidict.key_of(2) == "b"
+    bidict["c"] = 3
+    bidict["a"] = 4
+    assert bidict.inverse == {4: "a", 2: "b", 3: "c"}
+    del bidict["b"]
+    assert 2 not in bidict.inverse
+    bidict.inverse[5] = "d"
+    assert bidict["d"] == 5
+    assert bidict.inverse.inverse is bidict
+    assert len(bidict) == len(bidict.inverse) == 3
+    with pytest.raises(KeyError):
+        bidict.key_of(2)
+
+
+def test_bidict_collisions():
+    with pytest.raises(ValueError):
+        BiDict({"a": 1, "b": 1})
+    bidict = BiDict({"a": 1, None: 2})
+    with pytest.raises(ValueError):
+        bidict["b"] = 1
+    with pytest.raises(ValueError):
+        bidict["b"] = 2
+    bidict["a"] = 1
+    assert bidict == {"a": 1, None: 2}
+    assert bidict.inverse == {1: "a", 2: None}
+
+
 def test_get_vowel_count():
     assert get_vowel_count("iconic too so treasure") == {
         "so": 1,
@@ -306,8 +839,9 @@ def test_contain_keywords(inputs, keywords, expected):
     assert contain_keywords(inputs, keywords) == expected
 
 
-def test_passwd_to_dict():
-    fake_passwd = StringIO(
+def test_get_passwd_shells(tmp_path):
+    f = tmp_path / "passwd"
+    f.write_text(
         "###############\n"
         "# User Database\n"
         "###############\n"
@@ -317,8 +851,7 @@ def test_passwd_to_dict():
         "daemon:*:1:1:System Services:/var/root:/usr/bin/false\n"
         "foobarbaz:incomplete_data:info\n"
     )
-    with mock.patch("builtins.open", return_value=fake_passwd):
-        assert get_passwd_shells("file_path") == {"info", "/usr/bin/false", "/bin/sh"}
+    assert get_passwd_shells(f) == {"info", "/usr/bin/false", "/bin/sh"}
 
 
 def test_passwd_to_dict():
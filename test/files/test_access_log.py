@@ -0,0 +1,126 @@
+import pathlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.files.access_log import *
+
+LOG_PATH = pathlib.Path(__file__).parents[2] / "src" / "files" / "data" / "log.txt"
+
+
+################################################################################
+# Access log parsing
+
+
+def test_parse_line():
+    line = (
+        '"192.168.4.163 - - [22/Dec/2016:22:32:31 +0300] "GET /index.php HTTP/1.1" '
+        '200 3279 "-" "w3af.org""\n'
+    )
+    record = parse_line(line)
+    assert record == LogRecord(
+        "192.168.4.163",
+        "22/Dec/2016:22:32:31 +0300",
+        "GET",
+        "/index.php",
+        200,
+        3279,
+        "w3af.org",
+    )
+    assert record.minute == datetime(
+        2016, 12, 22, 22, 32, tzinfo=timezone(timedelta(hours=3))
+    )
+
+
+def test_parse_line_without_wrapping_quotes_or_bytes():
+    line = (
+        '10.0.0.1 - frank [01/Jan/2021:00:00:59 +0000] "POST /login HTTP/1.0" 304 - '
+        '"http://example.com/" "Mozilla/5.0 (X11; Linux x86_64)"'
+    )
+    record = parse_line(line)
+    assert (record.ip, record.method, record.status, record.bytes_sent) == (
+        "10.0.0.1",
+        "POST",
+        304,
+        0,
+    )
+    assert record.user_agent == "Mozilla/5.0 (X11; Linux x86_64)"
+
+
+def test_parse_line_without_request():
+    line = '10.0.0.1 - - [01/Jan/2021:00:00:59 +0000] "-" 408 - "-" "-"'
+    record = parse_line(line)
+    assert (record.method, record.path, record.status) == ("-", "-", 408)
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "",
+        "garbage",
+        '1.2.3.4 - - [x] "GET /" abc 12',
+        '1.2.3.4 - - [bad time] "GET /a HTTP/1.1" 200 10 "-" "curl"',
+        '1.2.3.4 - - [31/Foo/2021:00:00:01 +0000] "GET /a HTTP/1.1" 200 10 "-" "curl"',
+    ],
+)
+def test_parse_malformed_line(line):
+    assert parse_line(line) is None
+
+
+def test_iter_log():
+    records = list(iter_log(LOG_PATH))
+    assert len(records) == 3996
+    assert all(isinstance(record.status, int) for record in records)
+
+
+################################################################################
+# Access log reports
+
+
+def test_analyze_log():
+    report = analyze_log(LOG_PATH)
+    assert report.total_requests == 3996
+    assert report.malformed == 0
+    assert report.status_counts[200] == 2124
+    assert report.status_counts[404] == 490
+    assert report.top_ips(1) == [("192.168.4.163", 3914)]
+    assert sum(report.per_minute_rates().values()) == 3996
+    minutes = list(report.per_minute_rates())
+    assert minutes == sorted(minutes)
+
+
+def test_analyze_log_counts_malformed_lines(tmp_path):
+    f = tmp_path / "access.log"
+    f.write_text(
+        '1.2.3.4 - - [01/Jan/2021:00:00:01 +0000] "GET /a HTTP/1.1" 200 10 "-" "curl"\n'
+        "not a log line\n"
+        "\n"
+        '1.2.3.4 - - [bad time] "GET /a HTTP/1.1" 200 10 "-" "curl"\n'
+        '1.2.3.4 - - [01/Jan/2021:00:01:01 +0000] "GET /a HTTP/1.1" 500 5 "-" "curl"\n'
+    )
+    report = analyze_log(f)
+    assert report.malformed == 2
+    assert report.bytes_per_path == {"/a": 15}
+    assert list(report.per_minute_rates().values()) == [1, 1]
+
+
+def test_analyze_log_parallel_matches_serial():
+    serial = analyze_log(LOG_PATH)
+    parallel = analyze_log(LOG_PATH, workers=3, chunk_size=50_000)
+    assert parallel.requests_per_ip == serial.requests_per_ip
+    assert parallel.status_counts == serial.status_counts
+    assert parallel.bytes_per_path == serial.bytes_per_path
+    assert parallel.requests_per_minute == serial.requests_per_minute
+
+
+def test_follow_log(tmp_path):
+    f = tmp_path / "access.log"
+    f.write_text("")
+    records = follow_log(f, poll_interval=0.01, idle_timeout=0.2)
+    with open(f, "a") as log:
+        log.write(
+            '1.2.3.4 - - [01/Jan/2021:00:00:01 +0000] "GET /a HTTP/1.1" 200 1 "-" "x"\n'
+            "not a log line\n"
+            '1.2.3.4 - - [01/Jan/2021:00:00:02 +0000] "GET /b HTTP/1.1" 404 2 "-" "x"\n'
+        )
+    assert [record.path for record in records] == ["/a", "/b"]
@@ -0,0 +1,182 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from src.files.cache import *
+from src.files.files import find_longest_word, reduce_columns, word_count
+
+
+@pytest.fixture
+def result_cache(tmp_path):
+    result_cache = ResultCache(tmp_path / "cache.sqlite3")
+    set_result_cache(result_cache)
+    yield result_cache
+    set_result_cache(None)
+
+
+def counting(calls):
+    @cache_file_result
+    def line_count(file_path, offset=0):
+        calls.append(file_path)
+        with open(file_path) as f:
+            return sum(1 for _ in f) + offset
+
+    return line_count
+
+
+def test_cache_file_result_reuses_result(tmp_path, result_cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\nb\n")
+    calls = []
+    line_count = counting(calls)
+    assert line_count(path) == 2
+    assert line_count(path) == 2
+    assert len(calls) == 1
+    assert line_count(path, offset=1) == 3
+    assert len(calls) == 2
+
+
+def test_cache_file_result_invalidates_on_change(tmp_path, result_cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\nb\n")
+    calls = []
+    line_count = counting(calls)
+    assert line_count(path) == 2
+    path.write_text("a\nb\nc\n")
+    assert line_count(path) == 3
+    assert len(calls) == 2
+
+
+def test_cache_file_result_disabled(tmp_path):
+    set_result_cache(None)
+    path = tmp_path / "input.txt"
+    path.write_text("a\n")
+    calls = []
+    line_count = counting(calls)
+    line_count(path)
+    line_count(path)
+    assert len(calls) == 2
+
+
+def test_cache_file_result_binds_arguments(tmp_path, result_cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\nb\n")
+    calls = []
+    line_count = counting(calls)
+    assert line_count(file_path=path) == 2
+    assert line_count(path, 0) == 2
+    assert line_count(path, offset=0) == 2
+    assert len(calls) == 1
+    text_path = tmp_path / "input_words.txt"
+    text_path.write_text("a longest word\n")
+    assert find_longest_word(fp=text_path) == "longest"
+    set_result_cache(None)
+    assert find_longest_word(fp=text_path) == "longest"
+
+
+def test_cache_file_result_version(tmp_path, result_cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\n")
+
+    def line_count(file_path):
+        with open(file_path) as f:
+            return sum(1 for _ in f)
+
+    assert cache_file_result(version=1)(line_count)(path) == 1
+    assert cache_file_result(version=2)(line_count)(path) == 1
+    assert len(result_cache) == 2
+
+    def line_count(file_path):
+        return -1
+
+    assert cache_file_result(version=2)(line_count)(path) == -1
+
+
+REPO_ROOT = pathlib.Path(__file__).parents[2]
+
+CACHED_RUN_SCRIPT = """
+import sys
+from src.files.files import reduce_columns, word_count
+reduce_columns(sys.argv[1])
+word_count(sys.argv[1])
+"""
+
+
+def test_cache_keys_are_stable_across_processes(tmp_path):
+    path = tmp_path / "input.tsv"
+    path.write_text("2\t3\n4\t5\n")
+    db_path = tmp_path / "cache.sqlite3"
+    for seed in (1, 2):
+        subprocess.run(
+            [sys.executable, "-c", CACHED_RUN_SCRIPT, str(path)],
+            check=True,
+            cwd=REPO_ROOT,
+            env={
+                **os.environ,
+                "FILES_CACHE_PATH": str(db_path),
+                "PYTHONHASHSEED": str(seed),
+            },
+        )
+        assert len(ResultCache(db_path)) == 2
+
+
+def test_code_digest():
+    def with_comprehension(file_path):
+        return [word for word in {"a", "b"}]
+
+    def without_comprehension(file_path):
+        return list({"a", "b"})
+
+    assert code_digest(with_comprehension.__code__) == code_digest(
+        with_comprehension.__code__.replace()
+    )
+    assert code_digest(with_comprehension.__code__) != code_digest(
+        without_comprehension.__code__
+    )
+
+
+def test_cache_file_result_missing_file(tmp_path, result_cache):
+    line_count = counting([])
+    with pytest.raises(FileNotFoundError):
+        line_count(tmp_path / "missing.txt")
+    assert len(result_cache) == 0
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    result_cache = ResultCache(tmp_path / "cache.sqlite3", max_bytes=2500)
+    result_cache.set("a", b"x" * 1000)
+    result_cache.set("b", b"x" * 1000)
+    result_cache.get("a")
+    result_cache.set("c", b"x" * 1000)
+    assert result_cache.get("a") is not None
+    assert result_cache.get("b") is None
+    assert result_cache.get("c") is not None
+    result_cache.set("c", b"x" * 500)
+    connection = result_cache.connect()
+    (total,) = connection.execute("SELECT size FROM total_size").fetchone()
+    (actual,) = connection.execute("SELECT SUM(size) FROM results").fetchone()
+    assert total == actual
+    result_cache.clear()
+    assert len(result_cache) == 0
+
+
+def test_result_cache_persists(tmp_path):
+    ResultCache(tmp_path / "cache.sqlite3").set("key", {"lines": 3})
+    assert ResultCache(tmp_path / "cache.sqlite3").get("key") == {"lines": 3}
+
+
+def test_cached_file_functions(tmp_path, result_cache):
+    path = tmp_path / "input.tsv"
+    path.write_text("2\t3\n4\t5\n")
+    text_path = tmp_path / "input.txt"
+    text_path.write_text("a longest word\n")
+    assert reduce_columns(path) == 26
+    assert find_longest_word(text_path) == "longest"
+    assert word_count(path)["line_count"] == 2
+    assert len(result_cache) == 3
+    assert reduce_columns(path) == 26
+    assert word_count(path)["line_count"] == 2
+    assert len(result_cache) == 3
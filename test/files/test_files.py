@@ -1,3 +1,4 @@
+import csv
 from io import StringIO
 
 import mock
@@ -10,18 +11,60 @@ from src.files.files import *
 # Final Line
 
 
-def test_empty():
-    mock_open = mock.mock_open(read_data="")
-    with mock.patch("builtins.open", mock_open) as m:
-        result = final_line("file_path")
-    assert result == ""
-
-
-def test_final_line():
-    mock_open = mock.mock_open(read_data="a\nab\nabc\nabcd")
-    with mock.patch("builtins.open", mock_open) as m:
-        result = final_line("file_path")
-    assert result == "abcd"
+def test_empty(tmp_path):
+    f = tmp_path / "empty.txt"
+    f.write_text("")
+    assert final_line(f) == ""
+
+
+def test_final_line(tmp_path):
+    f = tmp_path / "lines.txt"
+    f.write_text("a\nab\nabc\nabcd")
+    assert final_line(f) == "abcd"
+
+
+def test_final_line_trailing_newline(tmp_path):
+    f = tmp_path / "lines.txt"
+    f.write_text("a\nab\nabc\nabcd\n")
+    assert final_line(f) == "abcd"
+
+
+def test_final_line_longer_than_block(tmp_path):
+    f = tmp_path / "lines.txt"
+    f.write_text("short\n" + "文書" * 10000 + "\n")
+    assert final_line(f) == "文書" * 10000
+
+
+@pytest.mark.parametrize(
+    "n, expected",
+    [
+        (0, []),
+        (1, ["abcd"]),
+        (3, ["ab", "abc", "abcd"]),
+        (10, ["a", "ab", "abc", "abcd"]),
+    ],
+)
+def test_last_lines(tmp_path, n, expected):
+    f = tmp_path / "lines.txt"
+    f.write_bytes(b"a\r\nab\r\nabc\r\nabcd\r\n")
+    assert last_lines(f, n, block_size=3) == expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        (b"", []),
+        (b"\n", [""]),
+        (b"\n\n", ["", ""]),
+        (b"a\n\n", ["a", ""]),
+        (b"a", ["a"]),
+    ],
+)
+def test_last_lines_empty_lines(tmp_path, content, expected):
+    f = tmp_path / "lines.txt"
+    f.write_bytes(content)
+    assert last_lines(f, 10, block_size=3) == expected
+    assert last_lines(f, 1) == expected[-1:]
 
 
 ################################################################################
@@ -34,12 +77,45 @@ def test_multi_columns_multi_rows():
         assert sum_multi_columns("file_path") == 32
 
 
+@pytest.fixture
+def nums_tsv(tmp_path):
+    f = tmp_path / "nums.tsv"
+    f.write_text("1\n" "1\t2\n" "3\t-2\t3\n" "\n" "1\t2\t3\t4\n")
+    return f
+
+
+@pytest.mark.parametrize(
+    "columns, reduction, expected",
+    [
+        (None, "product_sum", 2 - 18 + 24),
+        ([0, 1], "product_sum", 2 - 6 + 2),
+        ([2], "product_sum", 6),
+        (None, "column_sum", [5, 2, 6, 4]),
+        ([1, 0], "column_sum", [2, 5]),
+        ([-1], "product_sum", 2 + 3 + 4),
+        ([-3], "product_sum", 3 + 2),
+        ([-4, 0], "column_sum", [1, 1]),
+        (None, "min", [1, -2, 3, 4]),
+        (None, "max", [3, 2, 3, 4]),
+    ],
+)
+def test_reduce_columns(nums_tsv, columns, reduction, expected):
+    assert reduce_columns(nums_tsv, columns, reduction, buffer_size=4) == expected
+
+
+def test_reduce_columns_unknown_reduction(nums_tsv):
+    with pytest.raises(ValueError):
+        reduce_columns(nums_tsv, reduction="median")
+
+
 ################################################################################
 # /etc/passwd to dict
 
 
-def test_passwd_to_dict():
-    fake_passwd = StringIO(
+@pytest.fixture
+def user_database(tmp_path):
+    f = tmp_path / "passwd"
+    f.write_text(
         "###############\n"
         "# User Database\n"
         "###############\n"
@@ -49,12 +125,38 @@ def test_passwd_to_dict():
         "daemon:*:1:1:System Services:/var/root:/usr/bin/false\n"
         "foobarbaz:incomplete_data:info\n"
     )
-    with mock.patch("builtins.open", return_value=fake_passwd):
-        assert passwd_to_dict("file_path") == {
-            "daemon": {"home_dir": "/var/root", "id": "1", "shell": "/usr/bin/false"},
-            "nobody": {"home_dir": "/var/empty", "id": "-2", "shell": "/usr/bin/false"},
-            "root": {"home_dir": "/var/root", "id": "0", "shell": "/bin/sh"},
-        }
+    return f
+
+
+def test_passwd_to_dict(user_database):
+    assert passwd_to_dict(user_database) == {
+        "daemon": {"home_dir": "/var/root", "id": "1", "shell": "/usr/bin/false"},
+        "nobody": {"home_dir": "/var/empty", "id": "-2", "shell": "/usr/bin/false"},
+        "root": {"home_dir": "/var/root", "id": "0", "shell": "/bin/sh"},
+    }
+
+
+def test_passwd_database_lookups(user_database):
+    db = load_passwd(user_database)
+    assert db.get_user("root")[5] == "/var/root"
+    assert db.get_user("nobody") is db.get_uid(-2)
+    assert db.get_uid("1")[0] == "daemon"
+    assert db.get_uid(1000) is None
+    assert db.users_with_shell("/usr/bin/false") == ("nobody", "daemon")
+    assert db.users_with_shell("/bin/zsh") == ()
+    with pytest.raises(AttributeError):
+        db.users_with_shell("/usr/bin/false").append("guest")
+    assert load_passwd(user_database).users_with_shell("/bin/sh") == ("root",)
+
+
+def test_load_passwd_is_cached_until_modified(user_database):
+    db = load_passwd(user_database)
+    assert load_passwd(user_database) is db
+    with open(user_database, "a") as f:
+        f.write("guest:*:500:500:Guest:/home/guest:/bin/zsh\n")
+    reloaded = load_passwd(user_database)
+    assert reloaded is not db
+    assert reloaded.users_with_shell("/bin/zsh") == ("guest",)
 
 
 ################################################################################
@@ -71,6 +173,88 @@ def test_word_count():
         assert result["char_count"] == 17
 
 
+@pytest.mark.parametrize(
+    "inputs, expected",
+    [
+        ("", [""]),
+        ("  Foo BAR\n", ["foo", "bar"]),
+        ("wow!!! really?!?? ok,, fine;;", ["wow!", "really?!?", "ok,", "fine;"]),
+        ("and then.. or.... ...", ["and", "then...", "or...", "..."]),
+        ("see https://www.gutenberg.org!! now", ["see", "<URL>", "now"]),
+        ("go to WWW.Example.com...", ["go", "to", "<URL>"]),
+    ],
+)
+def test_normalize(inputs, expected):
+    assert normalize(inputs) == expected
+
+
+def test_normalize_many():
+    lines = ["Foo bar!!\n", "\n", "see www.example.com\n", "last.. line"]
+    assert Normalizer().normalize_many(lines) == [normalize(line) for line in lines]
+    assert Normalizer().normalize_many([]) == []
+
+
+@pytest.mark.parametrize("parts", [1, 2, 5, 100])
+def test_split_byte_ranges(tmp_path, parts):
+    f = tmp_path / "text.txt"
+    f.write_bytes(b"foo bar\nbaz\n\nqux quux\r\nlast")
+    ranges = split_byte_ranges(f, parts)
+    assert ranges[0][0] == 0 and ranges[-1][1] == f.stat().st_size
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(f.read_bytes()[end - 1 : end] == b"\n" for _, end in ranges[:-1])
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_word_count_parallel(tmp_path, workers):
+    f = tmp_path / "text.txt"
+    f.write_text(
+        "foo bar baz\n" "Foo bar 文書!!\r\n" "\n" "see www.example.com...\n" "foo" * 50
+    )
+    assert word_count_parallel(f, workers=workers, chunk_size=16) == word_count(f)
+
+
+def test_word_count_parallel_empty(tmp_path, empty_file):
+    assert word_count_parallel(empty_file, workers=2) == word_count(empty_file)
+
+
+def numbered_args(count, pulled):
+    for i in range(count):
+        pulled.append(i)
+        yield (i,)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_imap_bounded(ordered):
+    pulled = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = imap_bounded(pool, str, numbered_args(100, pulled), 4, ordered)
+        first = next(results)
+        assert len(pulled) <= 5
+        rest = list(results)
+    expected = [str(i) for i in range(100)]
+    if ordered:
+        assert [first] + rest == expected
+    else:
+        assert sorted([first] + rest) == sorted(expected)
+
+
+def test_imap_bounded_stops_early():
+    pulled = []
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        results = imap_bounded(pool, str, numbered_args(100, pulled), 3)
+        assert next(results) == "0"
+        results.close()
+    assert len(pulled) <= 4
+
+
+def test_map_byte_ranges(tmp_path):
+    f = tmp_path / "lines.txt"
+    f.write_text("".join(f"line {i}\n" for i in range(100)))
+    parts = list(map_byte_ranges(f, count_byte_range, workers=2, chunk_size=64))
+    assert len(parts) > 2
+    assert sum(counts["line_count"] for counts, _ in parts) == 100
+
+
 ################################################################################
 # Longest word per file/files
 
@@ -116,6 +300,34 @@ def test_big_file(big_file):
     assert find_longest_word(big_file) == "encyclopedia"
 
 
+def test_longest_word_ties_go_to_first(tmp_path):
+    f = tmp_path / "ties.txt"
+    f.write_text("abc xyz\nfoo bar\n")
+    assert find_longest_word(f) == "abc"
+
+
+@pytest.mark.parametrize(
+    "top_k, expected",
+    [
+        (0, []),
+        (1, ["encyclopedia"]),
+        (3, ["encyclopedia", "surprise,", "website:"]),
+    ],
+)
+def test_find_longest_words(tmp_path, top_k, expected):
+    f = tmp_path / "words.txt"
+    f.write_text(
+        "and this is, to no one's surprise, the third line\n"
+        "but the biggest word will probably be encyclopedia\n"
+        "encyclopedia again on a website: https://www.gutenberg.org\n"
+    )
+    assert find_longest_words(f, top_k) == expected
+
+
+def test_find_longest_words_short_file(small_file):
+    assert find_longest_words(small_file, 100)[:2] == ["second", "first"]
+
+
 def test_empty_directory(tmp_path):
     assert find_all_longest_words(tmp_path) == {}
 
@@ -132,6 +344,93 @@ def test_all_files(tmp_path, empty_file, small_file, big_file):
     }
 
 
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_all_files_skips_directories(tmp_path, small_file, executor):
+    (tmp_path / "subdir").mkdir()
+    assert find_all_longest_words(tmp_path, workers=2, executor=executor) == {
+        "smallfile.txt": "second"
+    }
+
+
+@pytest.mark.parametrize("workers", [2, None])
+def test_analyze_directory_stops_early(tmp_path, workers):
+    for i in range(100):
+        (tmp_path / f"{i}.txt").write_text("a\n")
+    calls = []
+    results = analyze_directory(tmp_path, calls.append, workers=workers)
+    assert next(results)[1] is None
+    results.close()
+    assert len(calls) < 100
+
+
+def test_analyze_directory_unknown_executor(tmp_path):
+    with pytest.raises(ValueError):
+        list(analyze_directory(tmp_path, find_longest_word, executor="fiber"))
+
+
+################################################################################
+# Incremental directory index
+
+
+def test_find_all_longest_words_manifest(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("short words\n")
+    (data / "b.txt").write_text("encyclopedia\n")
+    manifest = tmp_path / "manifest.json"
+    expected = {"a.txt": "short", "b.txt": "encyclopedia"}
+    assert find_all_longest_words(data, manifest_path=manifest) == expected
+    assert find_all_longest_words(data, manifest_path=manifest) == expected
+    assert json.loads(manifest.read_text())["entries"]["a.txt"]["result"] == "short"
+
+
+def test_directory_index_only_processes_changes(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("short words\n")
+    (data / "b.txt").write_text("encyclopedia\n")
+    (data / "c.txt").write_text("gone\n")
+    manifest = tmp_path / "manifest.json"
+    index = DirectoryIndex(manifest, find_longest_word)
+    index.update(data)
+    assert (index.processed, index.removed) == (3, 0)
+
+    (data / "a.txt").write_text("much longer words\n")
+    (data / "c.txt").unlink()
+    (data / "d.txt").write_text("new file\n")
+    index = DirectoryIndex(manifest, find_longest_word)
+    assert index.update(data) == {
+        "a.txt": "longer",
+        "b.txt": "encyclopedia",
+        "d.txt": "file",
+    }
+    assert (index.processed, index.removed) == (2, 1)
+    index.update(data)
+    assert (index.processed, index.removed) == (0, 0)
+
+
+def test_directory_index_hash_files_reuses_results(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("encyclopedia\n")
+    manifest = tmp_path / "manifest.json"
+    DirectoryIndex(manifest, find_longest_word, hash_files=True).update(data)
+    (data / "a.txt").rename(data / "renamed.txt")
+    index = DirectoryIndex(manifest, find_longest_word, hash_files=True)
+    assert index.update(data) == {"renamed.txt": "encyclopedia"}
+    assert (index.processed, index.removed) == (0, 1)
+
+
+def test_directory_index_ignores_other_manifests(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("encyclopedia\n")
+    manifest = tmp_path / "manifest.json"
+    DirectoryIndex(manifest, find_longest_word).update(data)
+    index = DirectoryIndex(manifest, score_stats)
+    assert index.entries == {}
+
+
 ################################################################################
 # Reading / Writing CSV
 
@@ -173,6 +472,28 @@ def test_passwd_to_csv(passwd_file):
     assert csv_content.splitlines()[-1] == "amotz\t1006"
 
 
+@pytest.mark.parametrize(
+    "rows",
+    [
+        [],
+        [["root", "0"], ["daemon", "1"], []],
+        [["tab\tinside", "0"], ["plain", "1"]],
+        [["quote\"inside", "0"], ["line\nbreak", "1"], ["cr\rreturn", "2"]],
+        [[""], ["", ""]],
+        [["number", 1], ["none", None]],
+    ],
+)
+def test_write_tsv_matches_csv_writer(tmp_path, rows):
+    expected = tmp_path / "expected.tsv"
+    with open(expected, "w") as f:
+        csv.writer(f, delimiter="\t").writerows(rows)
+    actual = tmp_path / "actual.tsv"
+    write_tsv(rows, actual, batch_size=1)
+    assert actual.read_bytes() == expected.read_bytes()
+    write_tsv(rows, actual, batch_size=10)
+    assert actual.read_bytes() == expected.read_bytes()
+
+
 ################################################################################
 # JSON
 
@@ -223,6 +544,30 @@ def test_score_file(tmp_path, score_file_1, score_file_2):
     assert csv_content.splitlines()[6].split("\t")[0] == "9b"
 
 
+@pytest.mark.parametrize("workers", [1, 2])
+def test_score_file_stats(tmp_path, score_file_1, score_file_2, workers):
+    write_path = tmp_path.parent / f"{tmp_path.name}-scores.tsv"
+    analyze_scores(tmp_path, write_path, workers=workers)
+    rows = [line.split("\t") for line in write_path.read_text().splitlines()]
+    assert len(rows) == 7
+    assert rows[1] == ["9a", "math", "65", "100", "85.0"]
+    assert rows[6] == ["9b", "science", "70", "97", "83.4"]
+
+
+def test_score_stats_merge(tmp_path):
+    (tmp_path / "9a.json").write_text('[{"math": 50}, {"math": 70}]')
+    (tmp_path / "9a.txt").write_text('[{"math": 90}]')
+    write_path = tmp_path.parent / f"{tmp_path.name}-scores.tsv"
+    analyze_scores(tmp_path, write_path)
+    assert write_path.read_text().splitlines()[1].split("\t") == [
+        "9a",
+        "math",
+        "50",
+        "90",
+        "70.0",
+    ]
+
+
 ################################################################################
 # Reverse lines
 
@@ -245,3 +590,50 @@ def test_reversing_lines(big_file):
     assert len(content) == 166
     assert content[:18] == "elif gib a fo enil"
     assert content[-18:] == "w tseggib eht tub\n"
+
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("chunk_size", [1, 64, 1 << 20])
+def test_reversing_lines_in_chunks(tmp_path, big_file, binary, chunk_size):
+    write_path = tmp_path / "reversed.txt"
+    reverse_lines(big_file, write_path, binary=binary, chunk_size=chunk_size)
+    assert write_path.read_text().splitlines() == [
+        line.rstrip()[::-1] for line in big_file.read_text().splitlines()
+    ]
+
+
+################################################################################
+# Follow
+
+
+def test_follow_appends_truncation_and_rotation(tmp_path):
+    f = tmp_path / "app.log"
+    f.write_text("old\n")
+    lines = follow(f, poll_interval=0.01, idle_timeout=0.2)
+    with open(f, "a") as log:
+        log.write("first\nsecond\npart")
+    assert next(lines) == "first"
+    assert next(lines) == "second"
+    with open(f, "a") as log:
+        log.write("ial\n")
+    assert next(lines) == "partial"
+
+    f.write_text("new\n")  # Truncated to fewer bytes than were already read
+    assert next(lines) == "new"
+
+    with open(f, "a") as log:
+        log.write("unfinished")
+    f.rename(tmp_path / "app.log.1")
+    f.write_text("rotated\n")
+    assert next(lines) == "unfinished"
+    assert next(lines) == "rotated"
+    assert list(lines) == []
+
+
+def test_follow_from_start(tmp_path):
+    f = tmp_path / "app.log"
+    f.write_bytes(b"a\r\nb\n")
+    assert list(follow(f, from_start=True, poll_interval=0.01, idle_timeout=0)) == [
+        "a",
+        "b",
+    ]